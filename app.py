@@ -13,131 +13,35 @@
 # Run:
 #   streamlit run app.py
 
-import os
-import re
 import time
-from datetime import timezone
-from urllib.parse import quote, urlparse
 
-import requests
 import streamlit as st
-from dateutil import parser as date_parser
 from streamlit_autorefresh import st_autorefresh
 
-
-# =========================
-# CONFIG
-# =========================
-AUTO_REFRESH_SECONDS = 30
-
-# Hard cutoff: only keep articles within last X hours
-MAX_ARTICLE_AGE_HOURS = 24
-
-# Good default (you can paste your bigger Bloomberg keyword preset in the UI input)
-DEFAULT_KEYWORDS = ["SPY", "FOMC", "Treasury", "yields", "inflation", "options", "gamma", "liquidity"]
-
-GOOGLE_NEWS_RSS = "https://news.google.com/rss/search?q={q}&hl=en-US&gl=US&ceid=US:en"
-BING_NEWS_ENDPOINT = "https://api.bing.microsoft.com/v7.0/news/search"
-
-HEADERS = {
-    "User-Agent": (
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-        "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120 Safari/537.36"
-    )
-}
-
-BING_API_KEY = os.getenv("BING_NEWS_API_KEY", "").strip()
-
-
-# =========================
-# FILTERS (Institutional + Noise)
-# =========================
-INSTITUTIONAL_KEYWORDS = [
-    # FED / CENTRAL BANKS
-    "fomc", "fed", "federal reserve", "powell", "minutes", "dot plot",
-    "forward guidance", "terminal rate", "rate path", "restrictive", "accommodative",
-    "balance sheet", "runoff", "qt", "qe", "ecb", "boj", "boe",
-
-    # MACRO DATA
-    "cpi", "ppi", "pce", "core pce", "inflation", "jobs report", "nonfarm payrolls", "nfp",
-    "jobless claims", "unemployment", "gdp", "retail sales", "ism", "pmi",
-
-    # TREASURY / RATES
-    "treasury", "auction", "bid-to-cover", "bid to cover", "tail",
-    "2-year", "2 year", "10-year", "10 year", "real yield", "real yields",
-    "yields", "yield curve", "term premium", "curve steepening", "curve flattening",
-
-    # FLOWS / POSITIONING
-    "rebalancing", "asset allocation", "positioning", "cta", "risk parity",
-    "etf inflows", "etf outflows", "creations", "redemptions",
-
-    # OPTIONS / VOL / DEALER
-    "options", "open interest", "gamma", "gamma exposure", "negative gamma", "positive gamma",
-    "dealer hedging", "delta hedging", "0dte", "implied volatility", "skew", "vix",
-
-    # LIQUIDITY / SYSTEM
-    "liquidity", "funding stress", "financial conditions", "repo", "sofr", "stress",
-]
-
-NOISE_KEYWORDS = [
-    "meme", "viral", "to the moon", "diamond hands", "paper hands",
-    "influencer", "hype", "ape",
-    "rockets", "soars", "surges", "plunges",
-]
+import archive
+import cluster
+import feedreplay
+import trends
+from scanner import (
+    AUTO_REFRESH_SECONDS,
+    DEFAULT_KEYWORDS,
+    MAX_ARTICLE_AGE_HOURS,
+    fetch_items,
+    process_items,
+    render_card_html,
+    rule_stats,
+    rules_status,
+)
 
 
 # =========================
-# BLOOMBERG SCORING LAYERS
+# RECORD / REPLAY (optional, see feedreplay.py)
 # =========================
-SOURCE_WHITELIST = [
-    "reuters.com", "bloomberg.com", "ft.com", "wsj.com",
-    "federalreserve.gov", "treasury.gov", "bls.gov", "bea.gov",
-    "cnbc.com", "marketwatch.com", "barrons.com",
-]
-
-SOURCE_BLACKLIST = [
-    "prnewswire.com", "businesswire.com", "globenewswire.com",
-    "accesswire.com", "newsfilecorp.com",
-    "seekingalpha.com", "themotleyfool.com", "investorplace.com",
-]
-
-CLICKBAIT_PHRASES = [
-    "what you need to know", "explained", "here's why", "here is why",
-    "everything you need to know", "you won't believe",
-    "price prediction", "forecast", "top picks", "buy now",
-]
-
-MODAL_WEAK_WORDS = [
-    "could", "might", "may", "likely", "unlikely",
-    "expected", "expected to", "set to", "poised to", "seen as",
-]
-
-WIRE_PHRASES = [
-    "said in a statement", "in a statement",
-    "according to people familiar", "people familiar with the matter",
-    "sources said", "data showed", "figures showed",
-    "markets repriced", "investors reassessed",
-    "traders priced in", "priced in",
-]
-
-HIGH_IMPACT_TRIGGERS = [
-    "cpi", "core cpi", "ppi", "pce", "core pce",
-    "nonfarm payrolls", "nfp", "jobless claims", "unemployment rate",
-    "fomc", "fed minutes", "dot plot", "powell",
-    "auction", "refunding", "bid-to-cover", "tail",
-    "2-year", "10-year", "real yield", "sofr", "repo", "qt",
-    "vix", "0dte", "gamma", "dealer hedging", "skew",
-]
-
-# Anti-noise terms specifically for the word “options”
-NEGATIVE_KEYWORDS = [
-    # sports
-    "quarterback", "broncos", "giants", "nfl", "nba", "mlb", "nhl", "soccer", "football",
-    # travel / visas / airlines
-    "rebooking", "flight", "flights", "airline", "visa",
-    # lifestyle
-    "brain", "learning", "health", "fitness",
-]
+# NEWS_RECORD_PATH=day.jsonl.gz  -> archive every raw upstream response
+# NEWS_REPLAY_PATH=day.jsonl.gz  -> serve the archive instead of the network
+#   (NEWS_REPLAY_SPEED=50 plays it back 50x faster than it was recorded)
+# NEWS_REPLAY_CLOCK              -> set by feedreplay.py serve / loadtest.py
+feedreplay.install_from_env()
 
 
 # =========================
@@ -177,325 +81,21 @@ if "auto_keywords" not in st.session_state:
     st.session_state["auto_keywords"] = DEFAULT_KEYWORDS
 
 
-# =========================
-# HELPERS
-# =========================
-def safe_parse_time(value: str) -> float:
-    if not value:
-        return 0.0
-    try:
-        dt = date_parser.parse(value)
-        if dt.tzinfo is None:
-            dt = dt.replace(tzinfo=timezone.utc)
-        return dt.timestamp()
-    except Exception:
-        return 0.0
-
-
-def time_ago(ts_seconds: float) -> str:
-    now = time.time()
-    diff = max(0, now - ts_seconds)
-    if diff < 60:
-        return f"{int(diff)}s"
-    if diff < 3600:
-        return f"{int(diff // 60)}m"
-    return f"{int(diff // 3600)}h"
-
-
-def count_hits(text: str, keywords: list[str]) -> int:
-    """
-    Bloomberg-style matching:
-    - Avoid substring false-positives by using word boundaries when possible
-    - Still supports multi-word phrases (e.g., 'jobless claims', 'real yield')
-    """
-    s = (text or "").lower()
-
-    hits = 0
-    for kw in keywords:
-        k = (kw or "").strip().lower()
-        if not k:
-            continue
-
-        # If keyword contains spaces or hyphen, do a simple substring match (phrase match)
-        # Example: "jobless claims", "10-year"
-        if (" " in k) or ("-" in k):
-            if k in s:
-                hits += 1
-            continue
-
-        # Single token: match as whole word
-        # Example: "fed" should not match "defeated"
-        if re.search(r"\b" + re.escape(k) + r"\b", s):
-            hits += 1
-
-    return hits
-
-
-def dedupe(items: list[dict]) -> list[dict]:
-    seen = set()
-    out = []
-    for a in items:
-        link = (a.get("link") or "").strip()
-        if link:
-            key = ("link", link)
-        else:
-            t = re.sub(r"\s+", " ", (a.get("title") or "").strip().lower())
-            key = ("title", t[:240])
-
-        if key in seen:
-            continue
-        seen.add(key)
-        out.append(a)
-    return out
-
-
-def filter_institutional(items: list[dict], min_kw: int, max_noise: int) -> list[dict]:
-    out = []
-    now_ts = time.time()
-    max_age_sec = float(MAX_ARTICLE_AGE_HOURS) * 3600.0
-
-    # Hard blocklist (sports / travel / lifestyle) — applied AFTER fetch for ALL sources
-    hard_block = [
-        "quarterback", "broncos", "giants", "nfl", "nba", "mlb", "nhl", "soccer", "football",
-        "rebooking", "flight", "flights", "airline", "visa",
-        "brain", "learning", "health", "fitness",
-    ]
-
-    # One compiled regex (faster + cleaner)
-    hard_block_re = re.compile(r"\b(" + "|".join(map(re.escape, hard_block)) + r")\b", re.IGNORECASE)
-
-    for a in items:
-        title = (a.get("title") or "").strip()
-        if len(title) < 5:
-            continue
-
-        ts = float(a.get("_ts") or 0.0)
-        if ts <= 0:
-            continue
-
-        if (now_ts - ts) > max_age_sec:
-            continue
-
-        blob = f"{title}\n{a.get('summary','')}".strip()
-
-        # HARD BLOCK (kills most "options" garbage)
-        if hard_block_re.search(blob):
-            continue
-
-        blob_l = blob.lower()
-        kw_hits = count_hits(blob_l, INSTITUTIONAL_KEYWORDS)
-        noise_hits = count_hits(blob_l, NOISE_KEYWORDS)
-
-        if kw_hits >= min_kw and noise_hits <= max_noise:
-            b = dict(a)
-            b["_kw_hits"] = kw_hits
-            b["_noise_hits"] = noise_hits
-            out.append(b)
-
-    return out
-
-
-def _extract_domain(url: str) -> str:
-    try:
-        host = (urlparse(url).netloc or "").lower()
-        return host.replace("www.", "")
-    except Exception:
-        return ""
-
-
-def _domain_in(domain: str, patterns: list[str]) -> bool:
-    if not domain:
-        return False
-    return any(p in domain for p in patterns)
-
-
-def score_bloomberg(item: dict) -> dict:
-    title = (item.get("title") or "").strip()
-    summary = (item.get("summary") or "").strip()
-    blob = f"{title}\n{summary}".lower()
-
-    domain = _extract_domain(item.get("link") or "")
-    score = 0
-    reasons = []
-
-    kw_hits = int(item.get("_kw_hits", 0))
-    noise_hits = int(item.get("_noise_hits", 0))
-
-    # Institutional signal
-    if kw_hits:
-        add = min(40, kw_hits * 6)
-        score += add
-        reasons.append(f"+inst({kw_hits})")
-
-    # High impact (macro/rates/options)
-    hi_hits = count_hits(blob, HIGH_IMPACT_TRIGGERS)
-    if hi_hits:
-        add = min(30, hi_hits * 8)
-        score += add
-        reasons.append(f"+impact({hi_hits})")
-
-    # Wire language
-    wire_hits = count_hits(blob, WIRE_PHRASES)
-    if wire_hits:
-        add = min(16, wire_hits * 8)
-        score += add
-        reasons.append(f"+wire({wire_hits})")
-
-    # Sources
-    if _domain_in(domain, SOURCE_WHITELIST):
-        score += 18
-        reasons.append("+whitelist")
-    if _domain_in(domain, SOURCE_BLACKLIST):
-        score -= 28
-        reasons.append("-blacklist")
-
-    # Noise penalty
-    if noise_hits:
-        score -= min(30, noise_hits * 10)
-        reasons.append(f"-noise({noise_hits})")
-
-    # Clickbait/modals penalty
-    cb_hits = count_hits(blob, CLICKBAIT_PHRASES)
-    if cb_hits:
-        score -= min(30, cb_hits * 15)
-        reasons.append(f"-clickbait({cb_hits})")
-
-    modal_hits = count_hits(blob, MODAL_WEAK_WORDS)
-    if modal_hits:
-        score -= min(18, modal_hits * 6)
-        reasons.append(f"-modal({modal_hits})")
-
-    score = max(-50, min(100, score))
-
-    out = dict(item)
-    out["_domain"] = domain
-    out["_score"] = score
-    out["_reasons"] = " ".join(reasons[:6])
-    return out
-
-
-# =========================
-# FETCHERS
-# =========================
-def fetch_google_news(keywords: list[str]) -> list[dict]:
-    base = " OR ".join(keywords) if keywords else "SPY"
-
-    # Force recency on Google News query
-    when = (
-        "when:1d" if MAX_ARTICLE_AGE_HOURS <= 24
-        else "when:2d" if MAX_ARTICLE_AGE_HOURS <= 48
-        else "when:7d"
-    )
-
-    negative = " ".join([f"-{w}" for w in NEGATIVE_KEYWORDS])
-
-    query = f"({base}) {when} {negative}"
-    url = GOOGLE_NEWS_RSS.format(q=quote(query))
-
-    feed = requests.get(url, headers=HEADERS, timeout=12)
-    feed.raise_for_status()
-
-    import feedparser
-    parsed = feedparser.parse(feed.content)
-
-    items = []
-    for e in parsed.entries[:50]:
-        title = getattr(e, "title", "") or ""
-        link = getattr(e, "link", "") or ""
-        published = getattr(e, "published", "") or ""
-        summary = getattr(e, "summary", "") or ""
-
-        ts = safe_parse_time(published)
-        items.append({
-            "source": "OZYTARGET.COM",
-            "title": title.strip(),
-            "link": link.strip(),
-            "time": published.strip(),
-            "summary": summary.strip(),
-            "_ts": ts,
-        })
-    return items
-
-
-def fetch_bing_news(keywords: list[str]) -> list[dict]:
-    if not BING_API_KEY:
-        return []
-
-    base = " OR ".join(keywords) if keywords else "SPY"
-
-    # Bing soporta operadores booleanos; esto ayuda a filtrar desde origen
-    # (No es perfecto, pero reduce bastante el ruido)
-    negatives = " OR ".join(NEGATIVE_KEYWORDS)
-    query = f"({base}) NOT ({negatives})"
-
-    freshness = "Day" if MAX_ARTICLE_AGE_HOURS <= 24 else "Week"
-
-    params = {
-        "q": query,
-        "mkt": "en-US",
-        "count": 25,
-        "sortBy": "Date",
-        "freshness": freshness,
-        "safeSearch": "Off",
-        "textFormat": "Raw",
-    }
-    headers = {"Ocp-Apim-Subscription-Key": BING_API_KEY, **HEADERS}
-    r = requests.get(BING_NEWS_ENDPOINT, params=params, headers=headers, timeout=12)
-    r.raise_for_status()
-    data = r.json()
-
-    items = []
-    for v in data.get("value", [])[:25]:
-        title = (v.get("name") or "").strip()
-        link = (v.get("url") or "").strip()
-        published = (v.get("datePublished") or "").strip()
-        ts = safe_parse_time(published)
-
-        items.append({
-            "source": "OZYTARGET.COM",
-            "title": title,
-            "link": link,
-            "time": published,
-            "summary": "",
-            "_ts": ts,
-        })
-    return items
-
-
 # =========================
 # SMOOTH AUTO-UPDATE (cached fetch)
 # =========================
 feed_box = st.container()
 
+# Only the upstream stage is cached: filter + scoring run per refresh against the
+# hot-reloaded scoring_rules.toml (memoized per rule version inside scanner.py)
 @st.cache_data(ttl=AUTO_REFRESH_SECONDS, show_spinner=False)
-def fetch_all_sources_cached(keywords: list[str], min_kw: int, max_noise: int, cache_buster: int = 0) -> list[dict]:
+def fetch_all_sources_cached(keywords: list[str], cache_buster: int = 0) -> list[dict]:
     """
     cache_buster:
       - Déjalo en 0 para auto-refresh normal (usa cache TTL=30s).
       - Pásale un número que cambie (ej: int(time.time())) para forzar un fetch real aunque exista cache.
     """
-    items: list[dict] = []
-
-    try:
-        items.extend(fetch_google_news(keywords))
-    except Exception:
-        pass
-
-    try:
-        items.extend(fetch_bing_news(keywords))
-    except Exception:
-        pass
-
-    items = dedupe(items)
-    items = filter_institutional(items, min_kw=min_kw, max_noise=max_noise)
-
-    # Score solo para badges (no para ordenar)
-    items = [score_bloomberg(x) for x in items]
-
-    # ORDER = MOST RECENT FIRST
-    items.sort(key=lambda x: x.get("_ts", 0.0), reverse=True)
-
-    return items
+    return fetch_items(keywords)
 
 
 # =========================
@@ -527,12 +127,79 @@ with colC2:
         f"<div class='small'>Auto-refresh every {AUTO_REFRESH_SECONDS}s | Cutoff: last {MAX_ARTICLE_AGE_HOURS}h</div>",
         unsafe_allow_html=True
     )
+    if cluster.CLUSTER_ENABLED:
+        cl = cluster.get_coordinator().status()
+        st.markdown(
+            f"<div class='small'>Cluster: {cl['role']} | ingester {cl['holder'] or '—'} (term {cl['term']}, "
+            f"lease {cl['lease_left']}s) | {cl['subscriptions']} keyword sets</div>",
+            unsafe_allow_html=True
+        )
 
 # If user asks to flush cache, do it immediately
 if flush_cache:
     fetch_all_sources_cached.clear()
     st.session_state["last_fetch_ts"] = 0.0
 
+# Scoring rules (scoring_rules.toml, hot-reloaded) + per-rule cost / hit counters
+rules = rules_status()
+with st.expander(f"📐 Scoring rules v{rules['version']} ({rules['digest']})", expanded=False):
+    if rules["error"]:
+        st.error(f"Rules file not applied, still on v{rules['version']}: {rules['error']}")
+    memo = rules["memo"]
+    st.markdown(
+        f"<div class='small'>{rules['path']} | memo {memo['size']} entries, "
+        f"{memo['hits']} hits / {memo['misses']} misses</div>",
+        unsafe_allow_html=True,
+    )
+    st.dataframe(rule_stats(), use_container_width=True, hide_index=True)
+
+# Historical headline search (archive.py, NEWS_ARCHIVE_DB)
+if archive.ARCHIVE_ENABLED:
+    with st.expander("🔎 Headline archive", expanded=False):
+        colQ, colS, colM, colR = st.columns([3, 2, 1, 1])
+        with colQ:
+            archive_query = st.text_input(
+                'Search ("phrase", AND / OR / NOT, prefix*)', key="archive_query",
+                placeholder='"repo rates" OR sofr NOT china',
+            )
+        with colS:
+            archive_domains = st.text_input(
+                "Domains (comma-separated)", key="archive_domains",
+                help="Subdomains match too: reuters.com also finds uk.reuters.com",
+            )
+        with colM:
+            archive_min_score = st.number_input("Min score", -50, 100, -50, key="archive_min_score")
+        with colR:
+            archive_days = st.number_input("Last N days", 1, 3650, 30, key="archive_days")
+
+        if archive_query.strip() or archive_domains.strip():
+            t0 = time.perf_counter()
+            try:
+                hits = archive.search(
+                    archive_query,
+                    domains=[d for d in archive_domains.split(",") if d.strip()] or None,
+                    min_score=archive_min_score if archive_min_score > -50 else None,
+                    since=time.time() - archive_days * 86400,
+                    limit=200,
+                )
+            except ValueError as e:
+                st.error(str(e))
+                hits = []
+            st.markdown(
+                f"<div class='small'>{len(hits)} headlines in {(time.perf_counter() - t0) * 1000:.1f} ms</div>",
+                unsafe_allow_html=True,
+            )
+            st.dataframe(
+                [
+                    {
+                        "published (UTC)": time.strftime("%Y-%m-%d %H:%M", time.gmtime(h["_ts"])),
+                        "score": h["_score"], "domain": h["_domain"], "title": h["title"], "link": h["link"],
+                    }
+                    for h in hits
+                ],
+                use_container_width=True, hide_index=True,
+            )
+
 # =========================
 # AUTO FETCH (every 30s) — force_refresh ALWAYS fetches fresh
 # =========================
@@ -544,12 +211,13 @@ if should_fetch:
         # cache_buster forces fresh fetch when force_refresh=True
         buster = int(now_ts) if force_refresh else 0
 
-        st.session_state["latest_news"] = fetch_all_sources_cached(
-            keywords=manual_keywords if manual_keywords else DEFAULT_KEYWORDS,
-            min_kw=min_kw_hits,
-            max_noise=max_noise_hits,
-            cache_buster=buster,
-        )
+        keywords = manual_keywords if manual_keywords else DEFAULT_KEYWORDS
+        if cluster.CLUSTER_ENABLED:
+            # One ingester per cluster (lease); every replica reads the shared store
+            raw_items = cluster.get_coordinator().get_items(keywords, force=force_refresh)
+        else:
+            raw_items = fetch_all_sources_cached(keywords=keywords, cache_buster=buster)
+        st.session_state["latest_news"] = process_items(raw_items, min_kw=min_kw_hits, max_noise=max_noise_hits)
         st.session_state["last_fetch_ts"] = now_ts
 
 
@@ -559,34 +227,31 @@ if should_fetch:
 with feed_box:
     st.markdown('<div class="header">OZYTARGET NEWS</div>', unsafe_allow_html=True)
 
+    # Keyword velocity (trends.py): fastest-rising terms vs their own baseline
+    trend_window = st.radio(
+        "Trend window", list(trends.WINDOWS), index=1, horizontal=True,
+        key="trend_window", label_visibility="collapsed",
+    )
+    movers = trends.get_trend_engine().top(trend_window, n=8)
+    if movers:
+        st.markdown(
+            "<div class='small'>TRENDING " + trend_window + " "
+            + "".join(
+                f"<span class='badge'>{'▲' if r['z'] > 0 else '▼' if r['z'] < 0 else '•'} {r['term']} "
+                f"{r['count']} ({r['velocity_per_h']}/h, z={r['z']})</span>"
+                for r in movers
+            )
+            + "</div>",
+            unsafe_allow_html=True,
+        )
+
     news = st.session_state.get("latest_news") or []
 
     if not news:
         st.info("📰 Loading news... (first fetch usually takes a few seconds)")
     else:
         for a in news[:80]:
-            st.markdown(
-                f"""
-<div class="card">
-  <div class="meta">
-    <span class="source">{a.get('source','')}</span>
-    <span>{time_ago(a.get('_ts', 0.0))} ago</span>
-    <span class="badge">score={a.get('_score', 0)}</span>
-    <span class="badge">kw={a.get('_kw_hits', 0)}</span>
-    <span class="badge">noise={a.get('_noise_hits', 0)}</span>
-    <span class="badge">{a.get('_domain','')}</span>
-    <span style="margin-left:10px;">| {a.get('time','')}</span>
-  </div>
-  <div class="title">
-    <a href="{a.get('link','')}" target="_blank" style="color:#e6edf3; text-decoration:none;">
-      {a.get('title','')}
-    </a>
-    <span class="badge" style="margin-left:8px;">{a.get('_reasons','')}</span>
-  </div>
-</div>
-""",
-                unsafe_allow_html=True,
-            )
+            st.markdown(render_card_html(a), unsafe_allow_html=True)
 
 st.markdown("---")
 st.markdown("*Developed by ozy | © 2026 | Mode News Scanner |*")
@@ -0,0 +1,533 @@
+# archive.py
+# Historical headline archive + full-text search (SQLite FTS5)
+#
+# NEWS_ARCHIVE_DB=/data/news_archive.sqlite  -> every scored headline the scanner shows is
+# archived (process_items -> record), kept past MAX_ARTICLE_AGE_HOURS, searchable for months.
+#
+# Query syntax (search / CLI / app):
+#   fed powell                    both words (AND)
+#   "repo rates" OR sofr          phrase, boolean OR
+#   gamma NOT bitcoin             exclusion;  ( ) group;  infl*  prefix
+#   gamma -bitcoin                same as NOT (a leading / trailing NOT is rejected, not dropped)
+#   10-year                       terms with punctuation are searched as phrases
+# Filters: domains (subdomains included), min/max score, since/until (unix ts).
+#
+# Row ids encode the published time (ms * 1000 + seq), so FTS5 walks matches newest first
+# and stops at LIMIT, and time ranges become rowid bounds pushed into the FTS index.
+#
+#   python archive.py search '"repo rates" AND sofr' --domain reuters.com --min-score 30 --since 30d
+#   python archive.py bench --rows 3000000        # proves p99 < 50ms on a few million headlines
+
+import argparse
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import scanner
+
+
+# =========================
+# CONFIG
+# =========================
+ARCHIVE_DB = os.getenv("NEWS_ARCHIVE_DB", "").strip()
+ARCHIVE_ENABLED = bool(ARCHIVE_DB)
+
+ARCHIVE_MAX_SEEN = 50000   # keys already written by this process (skip re-inserting every refresh)
+SEARCH_MAX_LIMIT = 500
+LATENCY_TARGET_MS = 50.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS headlines (
+    id INTEGER PRIMARY KEY,          -- published ms * 1000 + seq (time ordered)
+    url_key TEXT NOT NULL UNIQUE,
+    ts REAL NOT NULL,
+    domain TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    link TEXT NOT NULL,
+    source TEXT NOT NULL
+);
+-- domain + score band are indexed too, so selective filters intersect posting lists
+-- instead of being checked row by row (exact checks still run on headlines)
+CREATE VIRTUAL TABLE IF NOT EXISTS headlines_fts USING fts5(
+    title, domain, band, content='', columnsize=0, tokenize='unicode61 remove_diacritics 2'
+);
+"""
+
+SCORE_MIN, SCORE_MAX, SCORE_BAND = -50, 100, 10
+
+
+def _row_id(ts: float, seq: int = 0) -> int:
+    return int(ts * 1000) * 1000 + seq
+
+
+def _band(score: int) -> int:
+    return (min(max(int(score), SCORE_MIN), SCORE_MAX) - SCORE_MIN) // SCORE_BAND
+
+
+def _fts_row(rid: int, title: str, domain: str, score: int) -> tuple:
+    return rid, title, domain, f"s{_band(score)}"
+
+
+def _phrase(text: str) -> str:
+    return '"' + " ".join(re.findall(r"\w+", text, re.UNICODE)) + '"'
+
+
+def _url_key(a: dict) -> str:
+    link = (a.get("link") or "").strip()
+    if link:
+        return link
+    return "title:" + re.sub(r"\s+", " ", (a.get("title") or "").strip().lower())[:240]
+
+
+# =========================
+# QUERY TRANSLATION
+# =========================
+_QUERY_TOKEN_RE = re.compile(r'"[^"]*"|\(|\)|[^\s()"]+')
+_BAREWORD_RE = re.compile(r"^\w+\*?$", re.UNICODE)
+_OPERATORS = {"and": "AND", "or": "OR", "not": "NOT"}
+
+
+def to_fts_query(query: str) -> str:
+    """
+    User query -> FTS5 MATCH expression (operators uppercased, punctuated terms quoted).
+    Raises ValueError for what FTS5 cannot express, instead of searching something else:
+    NOT / -term with nothing on its left, NOT at the end, "OR NOT", "NOT NOT".
+    """
+    out = []
+
+    def push_op(op: str) -> None:
+        prev = out[-1] if out else None
+        if prev in ("AND", "OR", "NOT"):
+            if prev == "AND" and op == "NOT":
+                out[-1] = "NOT"  # FTS5 NOT is binary: "a AND NOT b" -> "a NOT b"
+                return
+            if prev == op and op != "NOT":
+                return  # "a AND AND b"
+            raise ValueError(f"cannot search {prev} {op}: FTS5 NOT needs a term on its left, e.g. 'fed NOT china'")
+        if op == "NOT" and (prev is None or prev == "("):
+            raise ValueError("NOT needs a term on its left (FTS5 NOT is binary), e.g. 'fed NOT china'")
+        out.append(op)
+
+    for tok in _QUERY_TOKEN_RE.findall(query or ""):
+        if tok in ("(", ")"):
+            if tok == ")" and out and out[-1] == "NOT":
+                raise ValueError("NOT needs a term after it, e.g. 'fed NOT china'")
+            out.append(tok)
+        elif tok.startswith('"'):
+            phrase = tok.strip('"').replace('"', "").strip()
+            if phrase:
+                out.append(f'"{phrase}"')
+        elif tok.lower() in _OPERATORS:
+            push_op(_OPERATORS[tok.lower()])
+        elif tok.startswith("-") and re.search(r"\w", tok, re.UNICODE):
+            # -china -> exclusion, same as NOT china
+            push_op("NOT")
+            rest = tok[1:]
+            out.append(rest if _BAREWORD_RE.match(rest) else _phrase(rest))
+        elif _BAREWORD_RE.match(tok):
+            out.append(tok)
+        else:
+            # 10-year, s&p, bid-to-cover -> phrase of its tokens
+            if re.search(r"\w", tok, re.UNICODE):
+                out.append(_phrase(tok))
+
+    if out and out[-1] == "NOT":
+        raise ValueError("NOT needs a term after it, e.g. 'fed NOT china'")
+    # Dangling AND / OR at the edges do not change the meaning; drop them
+    while out and out[0] in ("AND", "OR"):
+        out.pop(0)
+    while out and out[-1] in ("AND", "OR"):
+        out.pop()
+    return " ".join(out)
+
+
+# (query, expected FTS5 expression or ValueError) -- `python archive.py check`
+QUERY_CASES = [
+    ("fed powell", "fed powell"),
+    ('"repo rates" or sofr', '"repo rates" OR sofr'),
+    ("fed and not china", "fed NOT china"),
+    ("fed -china", "fed NOT china"),
+    ("fed -s&p", 'fed NOT "s p"'),
+    ("10-year s&p", '"10 year" "s p"'),
+    ("infl* (cpi OR ppi)", "infl* ( cpi OR ppi )"),
+    ("AND fed OR", "fed"),
+    ("fed AND AND cpi", "fed AND cpi"),
+    ("NOT china", ValueError),
+    ("-china", ValueError),
+    ("NOT NOT fed", ValueError),
+    ("fed NOT NOT china", ValueError),
+    ("fed NOT", ValueError),
+    ("fed OR NOT china", ValueError),
+    ("fed (NOT china)", ValueError),
+    ("(fed NOT) cpi", ValueError),
+]
+
+
+def check_query_translation() -> list[str]:
+    """Failures of QUERY_CASES (empty list = all good)."""
+    failures = []
+    for query, expected in QUERY_CASES:
+        try:
+            got = to_fts_query(query)
+        except ValueError as e:
+            got = ValueError
+            detail = str(e)
+        else:
+            detail = got
+        if got != expected:
+            want = "ValueError" if expected is ValueError else repr(expected)
+            failures.append(f"{query!r}: expected {want}, got {detail!r}")
+    return failures
+
+
+# =========================
+# STORE
+# =========================
+class HeadlineArchive:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._seen: OrderedDict[str, None] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db().executescript(SCHEMA)
+
+    def _db(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA cache_size=-65536")  # 64 MB page cache per connection
+            self._local.conn = conn
+        return conn
+
+    def record(self, items: list[dict]) -> int:
+        """
+        Archive scored items not written before. Returns rows inserted.
+        Keys are remembered only once the transaction committed, so a failed write
+        (e.g. "database is locked") is retried on the next refresh.
+        """
+        with self._lock:
+            fresh = [(key, a) for key, a in ((_url_key(a), a) for a in items) if key not in self._seen]
+        if not fresh:
+            return 0
+
+        conn = self._db()
+        inserted = 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for key, a in fresh:
+                if conn.execute("SELECT 1 FROM headlines WHERE url_key = ?", (key,)).fetchone():
+                    continue
+                ts = float(a.get("_ts") or 0.0)
+                title = (a.get("title") or "").strip()
+                if ts <= 0 or not title:
+                    continue
+                row = (
+                    key, ts, a.get("_domain") or scanner._extract_domain(a.get("link") or ""),
+                    int(a.get("_score", 0)), title, (a.get("link") or "").strip(), a.get("source") or "",
+                )
+                for seq in range(1000):
+                    rid = _row_id(ts, seq)
+                    try:
+                        conn.execute(
+                            "INSERT INTO headlines (id, url_key, ts, domain, score, title, link, source) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                            (rid, *row),
+                        )
+                    except sqlite3.IntegrityError:
+                        continue  # same millisecond as another headline
+                    conn.execute(
+                        "INSERT INTO headlines_fts (rowid, title, domain, band) VALUES (?, ?, ?, ?)",
+                        _fts_row(rid, title, row[2], row[3]),
+                    )
+                    inserted += 1
+                    break
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        with self._lock:
+            for key, _ in fresh:
+                self._seen[key] = None
+            while len(self._seen) > ARCHIVE_MAX_SEEN:
+                self._seen.popitem(last=False)
+        return inserted
+
+    def search(
+        self,
+        query: str = "",
+        domains: list[str] | None = None,
+        min_score: int | None = None,
+        max_score: int | None = None,
+        since: float | None = None,
+        until: float | None = None,
+        limit: int = 50,
+    ) -> list[dict]:
+        """
+        Newest first. `query` uses the syntax in the module header (empty = filters only).
+        Raises ValueError on a query FTS5 cannot parse.
+        """
+        limit = max(1, min(int(limit), SEARCH_MAX_LIMIT))
+        lo = _row_id(since) if since else 0
+        hi = _row_id(until, 999) if until else (1 << 62)
+
+        where, params, match = [], [], []
+        fts = to_fts_query(query)
+        if fts:
+            match.append(f"title : ( {fts} )")
+        if min_score is not None:
+            where.append("h.score >= ?")
+            params.append(int(min_score))
+        if max_score is not None:
+            where.append("h.score <= ?")
+            params.append(int(max_score))
+        if min_score is not None or max_score is not None:
+            lo_band = _band(min_score if min_score is not None else SCORE_MIN)
+            hi_band = _band(max_score if max_score is not None else SCORE_MAX)
+            match.append("band : ( " + " OR ".join(f"s{b}" for b in range(lo_band, hi_band + 1)) + " )")
+        doms = [d.strip().lower().removeprefix("www.") for d in domains or [] if d.strip()]
+        if doms:
+            # reuters.com matches reuters.com and uk.reuters.com (not notreuters.com);
+            # the FTS phrase below is only the prefilter
+            where.append("(" + " OR ".join(["h.domain = ? OR h.domain LIKE ? ESCAPE '\\'"] * len(doms)) + ")")
+            for d in doms:
+                params.extend([d, "%." + re.sub(r"([\\%_])", r"\\\1", d)])
+            match.append("domain : ( " + " OR ".join(_phrase(d) for d in doms) + " )")
+        extra = "".join(f" AND {w}" for w in where)
+
+        if match:
+            sql = (
+                "SELECT h.id, h.ts, h.domain, h.score, h.title, h.link, h.source "
+                "FROM headlines_fts f JOIN headlines h ON h.id = f.rowid "
+                f"WHERE headlines_fts MATCH ? AND f.rowid BETWEEN ? AND ?{extra} "
+                "ORDER BY f.rowid DESC LIMIT ?"
+            )
+            args = [" AND ".join(match), lo, hi, *params, limit]
+        else:
+            sql = (
+                "SELECT h.id, h.ts, h.domain, h.score, h.title, h.link, h.source FROM headlines h "
+                "WHERE h.id BETWEEN ? AND ? ORDER BY h.id DESC LIMIT ?"
+            )
+            args = [lo, hi, limit]
+
+        try:
+            rows = self._db().execute(sql, args).fetchall()
+        except sqlite3.OperationalError as e:
+            raise ValueError(f"bad search query {query!r}: {e}") from e
+
+        return [
+            {"_ts": r[1], "_domain": r[2], "_score": r[3], "title": r[4], "link": r[5], "source": r[6]}
+            for r in rows
+        ]
+
+    def count(self) -> int:
+        return self._db().execute("SELECT COUNT(*) FROM headlines").fetchone()[0]
+
+
+_archive: HeadlineArchive | None = None
+_archive_lock = threading.Lock()
+
+
+def get_archive() -> HeadlineArchive:
+    global _archive
+    with _archive_lock:
+        if _archive is None:
+            _archive = HeadlineArchive(ARCHIVE_DB)
+    return _archive
+
+
+def record(items: list[dict]) -> int:
+    """Ingestion hook (scanner.process_items). Never raises: the feed must not depend on the archive."""
+    try:
+        return get_archive().record(items)
+    except Exception:
+        return 0
+
+
+def search(query: str = "", **filters) -> list[dict]:
+    return get_archive().search(query, **filters)
+
+
+def parse_since(value: str) -> float | None:
+    """'30d' / '12h' / '90m' -> now - that; anything else is parsed as a date."""
+    if not value:
+        return None
+    m = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([dhm])\s*", value.lower())
+    if m:
+        n, unit = float(m.group(1)), m.group(2)
+        return time.time() - n * {"d": 86400, "h": 3600, "m": 60}[unit]
+    return scanner.safe_parse_time(value) or None
+
+
+# =========================
+# BENCHMARK
+# =========================
+_BENCH_FILLER = (
+    "says amid after ahead of as markets stocks bonds traders investors week data report "
+    "shares futures dollar oil banks earnings outlook growth risk rally selloff higher lower "
+    "signals warns sees holds cuts raises record slump jump slide gains losses china europe"
+).split()
+
+BENCH_QUERIES = [
+    ("common term", "fed", {}),
+    ("two terms", "treasury auction", {}),
+    ("phrase", '"negative gamma"', {}),
+    ("boolean", '("repo rates" OR sofr) AND NOT china', {}),
+    ("prefix", "inflat*", {}),
+    ("hyphenated", "10-year yields", {}),
+    ("domain filter", "powell", {"domains": ["reuters.com"]}),
+    ("rare domain", "fed", {"domains": ["bls.gov"]}),
+    ("score filter", "cpi", {"min_score": 60}),
+    ("last 7 days", "fomc", {"since_days": 7}),
+    ("30-60 days ago", "vix", {"since_days": 60, "until_days": 30}),
+    ("filters only", "", {"domains": ["wsj.com"], "min_score": 40}),
+    ("rare dom+score", "fed", {"domains": ["bls.gov"], "min_score": 90}),
+    ("rare filters only", "", {"domains": ["bls.gov"], "min_score": 95}),
+    ("no match", "fed AND cpi AND vix AND sofr", {}),
+]
+
+
+def bench_populate(arc: HeadlineArchive, rows: int, days: float = 180.0, seed: int = 7) -> None:
+    """Synthetic months of headlines: institutional terms + filler, skewed domains and scores."""
+    rnd = random.Random(seed)
+    terms = list(scanner.get_rule_plan().institutional_terms) + ["repo rates", "china"]
+    domains = (
+        ["reuters.com"] * 30 + ["bloomberg.com"] * 25 + ["cnbc.com"] * 15 + ["wsj.com"] * 10
+        + ["marketwatch.com"] * 10 + ["seekingalpha.com"] * 8 + ["ft.com"] * 2 + ["bls.gov"]
+    )
+    end = time.time()
+    start = end - days * 86400
+    step = (end - start) / rows
+
+    conn = arc._db()
+    conn.execute("PRAGMA synchronous=OFF")
+    batch, fts_batch = [], []
+    conn.execute("BEGIN")
+    for i in range(rows):
+        ts = start + i * step
+        rid = _row_id(ts, i % 1000)
+        words = rnd.sample(_BENCH_FILLER, 5) + [rnd.choice(terms) for _ in range(rnd.randint(1, 3))]
+        rnd.shuffle(words)
+        title = " ".join(words).capitalize()
+        dom = rnd.choice(domains)
+        score = int(rnd.triangular(SCORE_MIN, SCORE_MAX, 20))
+        batch.append((rid, f"bench:{i}", ts, dom, score, title, f"https://www.{dom}/n/{i}", "BENCH"))
+        fts_batch.append(_fts_row(rid, title, dom, score))
+        if len(batch) >= 50000:
+            conn.executemany("INSERT INTO headlines VALUES (?, ?, ?, ?, ?, ?, ?, ?)", batch)
+            conn.executemany("INSERT INTO headlines_fts (rowid, title, domain, band) VALUES (?, ?, ?, ?)", fts_batch)
+            batch, fts_batch = [], []
+    if batch:
+        conn.executemany("INSERT INTO headlines VALUES (?, ?, ?, ?, ?, ?, ?, ?)", batch)
+        conn.executemany("INSERT INTO headlines_fts (rowid, title, domain, band) VALUES (?, ?, ?, ?)", fts_batch)
+    conn.execute("COMMIT")
+    conn.execute("INSERT INTO headlines_fts (headlines_fts) VALUES ('optimize')")
+    conn.execute("ANALYZE")
+    conn.execute("PRAGMA synchronous=NORMAL")
+
+
+def _pct(values: list[float], q: float) -> float:
+    s = sorted(values)
+    return s[min(len(s) - 1, int(round(q * (len(s) - 1))))] if s else 0.0
+
+
+def cmd_bench(args) -> None:
+    arc = HeadlineArchive(args.db)
+    have = arc.count()
+    if have < args.rows:
+        print(f"[bench] populating {args.rows - have:,} synthetic headlines into {args.db} ...", flush=True)
+        t0 = time.perf_counter()
+        bench_populate(arc, args.rows - have)
+        print(f"[bench] loaded in {time.perf_counter() - t0:.0f}s", flush=True)
+    print(f"[bench] {arc.count():,} headlines, {os.path.getsize(args.db) / 1e6:.0f} MB, limit={args.limit}")
+
+    now = time.time()
+    worst = 0.0
+    print(f"{'query':<18}{'rows':>6}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, q, f in BENCH_QUERIES:
+        filters = {k: v for k, v in f.items() if k not in ("since_days", "until_days")}
+        if "since_days" in f:
+            filters["since"] = now - f["since_days"] * 86400
+        if "until_days" in f:
+            filters["until"] = now - f["until_days"] * 86400
+
+        arc.search(q, limit=args.limit, **filters)  # warm page cache
+        lat, n = [], 0
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            n = len(arc.search(q, limit=args.limit, **filters))
+            lat.append((time.perf_counter() - t0) * 1000.0)
+        p99 = _pct(lat, 0.99)
+        worst = max(worst, p99)
+        print(f"{name:<18}{n:>6}{_pct(lat, 0.5):>10.2f}{p99:>10.2f}{max(lat):>10.2f}")
+
+    ok = worst < LATENCY_TARGET_MS
+    print(f"worst p99 = {worst:.2f} ms -> {'PASS' if ok else 'FAIL'} (target < {LATENCY_TARGET_MS:.0f} ms)")
+    if not ok:
+        raise SystemExit(1)
+
+
+def cmd_search(args) -> None:
+    arc = HeadlineArchive(args.db)
+    t0 = time.perf_counter()
+    try:
+        rows = arc.search(
+            " ".join(args.query), domains=args.domain, min_score=args.min_score, max_score=args.max_score,
+            since=parse_since(args.since), until=parse_since(args.until), limit=args.limit,
+        )
+    except ValueError as e:
+        raise SystemExit(str(e))
+    took = (time.perf_counter() - t0) * 1000.0
+    for r in rows:
+        when = time.strftime("%Y-%m-%d %H:%M", time.gmtime(r["_ts"]))
+        print(f"{when}  {r['_score']:>4}  {r['_domain']:<20} {r['title']}")
+    print(f"-- {len(rows)} results in {took:.1f} ms")
+
+
+def cmd_check(args) -> None:
+    failures = check_query_translation()
+    for f in failures:
+        print("FAIL", f)
+    print(f"{len(QUERY_CASES) - len(failures)}/{len(QUERY_CASES)} query translations OK")
+    if failures:
+        raise SystemExit(1)
+
+
+def main(argv=None) -> None:
+    p = argparse.ArgumentParser(description="Historical headline archive (SQLite FTS5)")
+    sub = p.add_subparsers(dest="cmd", required=True)
+
+    s = sub.add_parser("search", help="search the archive")
+    s.add_argument("query", nargs="*")
+    s.add_argument("--db", default=ARCHIVE_DB or "news_archive.sqlite")
+    s.add_argument("--domain", action="append", help="repeatable; subdomains match too (reuters.com -> uk.reuters.com)")
+    s.add_argument("--min-score", type=int)
+    s.add_argument("--max-score", type=int)
+    s.add_argument("--since", default="", help="30d / 12h / date")
+    s.add_argument("--until", default="", help="30d / 12h / date")
+    s.add_argument("--limit", type=int, default=50)
+    s.set_defaults(func=cmd_search)
+
+    c = sub.add_parser("check", help="verify query translation (QUERY_CASES)")
+    c.set_defaults(func=cmd_check)
+
+    b = sub.add_parser("bench", help="populate a synthetic archive and check query latency")
+    b.add_argument("--db", default="bench_archive.sqlite")
+    b.add_argument("--rows", type=int, default=3_000_000)
+    b.add_argument("--repeat", type=int, default=50)
+    b.add_argument("--limit", type=int, default=50)
+    b.set_defaults(func=cmd_bench)
+
+    args = p.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+# cluster.py
+# Multi-replica coordination: one upstream poller (ingester) per cluster
+#
+# NEWS_CLUSTER_DB=/data/news_cluster.sqlite  (same file for every replica: shared volume / one box)
+#
+# - Lease: one SQLite row (holder, expires_at, term). Every replica heartbeats; whoever
+#   holds an unexpired lease is the ingester. If it dies, the lease runs out after
+#   NEWS_CLUSTER_LEASE_SECONDS and the next heartbeat elsewhere takes over (term + 1).
+# - Subscriptions: each replica registers the keyword sets its sessions ask for.
+# - Store: the ingester fetches every live subscription once per AUTO_REFRESH_SECONDS
+#   (scanner.fetch_items) and writes a snapshot; all replicas read snapshots only.
+#   Writes are fenced by lease term, so a deposed ingester cannot overwrite.
+#
+# Upstream request rate depends on subscriptions, not on the number of replicas.
+# Without NEWS_CLUSTER_DB, app.py keeps fetching per replica as before.
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+import scanner
+
+
+# =========================
+# CONFIG
+# =========================
+CLUSTER_DB = os.getenv("NEWS_CLUSTER_DB", "").strip()
+CLUSTER_ENABLED = bool(CLUSTER_DB)
+
+LEASE_NAME = "ingester"
+LEASE_SECONDS = float(os.getenv("NEWS_CLUSTER_LEASE_SECONDS", "10") or 10)
+SUBSCRIPTION_TTL_SECONDS = 10 * 60   # keyword sets nobody asked for in this long are dropped
+FIRST_READ_WAIT_SECONDS = 15.0       # a new keyword set waits this long for its first snapshot
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lease (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    term INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS subscriptions (
+    key TEXT PRIMARY KEY,
+    keywords TEXT NOT NULL,
+    last_seen REAL NOT NULL,
+    requested_at REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    key TEXT PRIMARY KEY,
+    fetched_at REAL NOT NULL,
+    term INTEGER NOT NULL,
+    holder TEXT NOT NULL,
+    items TEXT NOT NULL
+);
+"""
+
+
+def keywords_key(keywords: list[str]) -> list[str]:
+    """Order / case / duplicate insensitive keyword set (what the ingester fetches)."""
+    return sorted({k.strip().casefold() for k in keywords if k and k.strip()})
+
+
+class Coordinator:
+    def __init__(
+        self,
+        path: str,
+        replica_id: str | None = None,
+        lease_seconds: float = LEASE_SECONDS,
+        interval: float = scanner.AUTO_REFRESH_SECONDS,
+        fetch=None,
+    ):
+        self.path = path
+        self.replica_id = replica_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.lease_seconds = float(lease_seconds)
+        self.interval = float(interval)
+        self.fetch = fetch or scanner.fetch_items
+
+        self.is_leader = False
+        self.term = 0
+        self.upstream_fetches = 0
+        self.last_error = ""
+
+        self._local = threading.local()
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+        self._db().executescript(SCHEMA)
+
+    def _db(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # --- lease ---
+    def try_acquire(self) -> bool:
+        """Take or renew the lease. True if this replica is the ingester for the next lease_seconds."""
+        now = time.time()
+        conn = self._db()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT holder, expires_at, term FROM lease WHERE name = ?", (LEASE_NAME,)).fetchone()
+            if row is None:
+                term = 1
+                conn.execute(
+                    "INSERT INTO lease (name, holder, expires_at, term) VALUES (?, ?, ?, ?)",
+                    (LEASE_NAME, self.replica_id, now + self.lease_seconds, term),
+                )
+            elif row[0] == self.replica_id and row[1] >= now:
+                term = row[2]
+                conn.execute("UPDATE lease SET expires_at = ? WHERE name = ?", (now + self.lease_seconds, LEASE_NAME))
+            elif row[1] < now:
+                term = row[2] + 1
+                conn.execute(
+                    "UPDATE lease SET holder = ?, expires_at = ?, term = ? WHERE name = ?",
+                    (self.replica_id, now + self.lease_seconds, term, LEASE_NAME),
+                )
+            else:
+                conn.execute("COMMIT")
+                self.is_leader = False
+                return False
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        self.is_leader = True
+        self.term = term
+        return True
+
+    def release(self) -> None:
+        self._db().execute(
+            "UPDATE lease SET expires_at = 0 WHERE name = ? AND holder = ?",
+            (LEASE_NAME, self.replica_id),
+        )
+        self.is_leader = False
+
+    # --- shared store ---
+    def subscribe(self, keywords: list[str], force: bool = False) -> str:
+        key = json.dumps(keywords_key(keywords))
+        now = time.time()
+        self._db().execute(
+            """
+            INSERT INTO subscriptions (key, keywords, last_seen, requested_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                last_seen = excluded.last_seen,
+                requested_at = MAX(subscriptions.requested_at, excluded.requested_at)
+            """,
+            (key, key, now, now if force else 0.0),
+        )
+        return key
+
+    def read(self, key: str) -> tuple[float, list[dict]] | None:
+        row = self._db().execute("SELECT fetched_at, items FROM snapshots WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def get_items(self, keywords: list[str], force: bool = False, wait: float = FIRST_READ_WAIT_SECONDS) -> list[dict]:
+        """
+        Items from the shared store. Waits (up to `wait`) only for a keyword set with no
+        snapshot yet, or for the re-fetch a forced refresh asked for.
+        """
+        asked_at = time.time()
+        key = self.subscribe(keywords, force=force)
+        while True:
+            snap = self.read(key)
+            if snap is not None and (not force or snap[0] >= asked_at):
+                return snap[1]
+            if time.time() - asked_at >= wait:
+                return snap[1] if snap else []
+            time.sleep(0.25)
+
+    def _due(self) -> list[tuple[str, list[str]]]:
+        now = time.time()
+        conn = self._db()
+        conn.execute("DELETE FROM subscriptions WHERE last_seen < ?", (now - SUBSCRIPTION_TTL_SECONDS,))
+        conn.execute("DELETE FROM snapshots WHERE key NOT IN (SELECT key FROM subscriptions)")
+        rows = conn.execute(
+            """
+            SELECT s.key, s.keywords, COALESCE(n.fetched_at, 0), s.requested_at
+            FROM subscriptions s LEFT JOIN snapshots n ON n.key = s.key
+            ORDER BY s.last_seen DESC
+            """
+        ).fetchall()
+        return [
+            (key, json.loads(kws))
+            for key, kws, fetched_at, requested_at in rows
+            if (now - fetched_at) >= self.interval or requested_at > fetched_at
+        ]
+
+    def _store(self, key: str, items: list[dict], term: int) -> bool:
+        """Write a snapshot only while still holding the lease with the same term (fencing)."""
+        conn = self._db()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT holder, expires_at, term FROM lease WHERE name = ?", (LEASE_NAME,)).fetchone()
+            if row is None or row[0] != self.replica_id or row[2] != term or row[1] < time.time():
+                conn.execute("COMMIT")
+                self.is_leader = False
+                return False
+            conn.execute(
+                """
+                INSERT INTO snapshots (key, fetched_at, term, holder, items) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    fetched_at = excluded.fetched_at, term = excluded.term,
+                    holder = excluded.holder, items = excluded.items
+                """,
+                (key, time.time(), term, self.replica_id, json.dumps(items)),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return True
+
+    def ingest_once(self) -> int:
+        """One ingester pass: fetch every due subscription. Returns snapshots written."""
+        if not self.is_leader:
+            return 0
+        term = self.term
+        written = 0
+        for key, keywords in self._due():
+            items = self.fetch(keywords or scanner.DEFAULT_KEYWORDS)
+            self.upstream_fetches += 1
+            if not self._store(key, items, term):
+                break
+            written += 1
+        return written
+
+    # --- background threads ---
+    def _heartbeat_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.try_acquire()
+                self.last_error = ""
+            except Exception as e:
+                self.is_leader = False
+                self.last_error = f"{type(e).__name__}: {e}"
+            self._stop.wait(self.lease_seconds / 4)
+
+    def _ingest_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.ingest_once()
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+            self._stop.wait(0.5)
+
+    def start(self) -> "Coordinator":
+        if not self._threads:
+            for name, target in (("cluster-heartbeat", self._heartbeat_loop), ("cluster-ingest", self._ingest_loop)):
+                t = threading.Thread(target=target, name=name, daemon=True)
+                t.start()
+                self._threads.append(t)
+        return self
+
+    def stop(self, release: bool = True) -> None:
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout=5)
+        if release:
+            self.release()
+
+    def status(self) -> dict:
+        row = self._db().execute("SELECT holder, expires_at, term FROM lease WHERE name = ?", (LEASE_NAME,)).fetchone()
+        subs = self._db().execute("SELECT COUNT(*) FROM subscriptions").fetchone()[0]
+        holder, expires_at, term = row if row else ("", 0.0, 0)
+        return {
+            "replica": self.replica_id,
+            "role": "ingester" if self.is_leader else "follower",
+            "holder": holder,
+            "term": term,
+            "lease_left": round(max(0.0, expires_at - time.time()), 1),
+            "subscriptions": subs,
+            "upstream_fetches": self.upstream_fetches,
+            "error": self.last_error,
+        }
+
+
+_coordinator: Coordinator | None = None
+_coordinator_lock = threading.Lock()
+
+
+def get_coordinator() -> Coordinator:
+    """Process-wide coordinator on NEWS_CLUSTER_DB, started on first use."""
+    global _coordinator
+    with _coordinator_lock:
+        if _coordinator is None:
+            _coordinator = Coordinator(CLUSTER_DB).start()
+    return _coordinator
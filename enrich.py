@@ -0,0 +1,429 @@
+# enrich.py
+# Optional article body enrichment (lead paragraphs) for scoring
+#
+# - Off by default: NEWS_ENRICH=1 turns it on
+# - Never blocks the feed: run_pipeline() only reads the cache and queues misses;
+#   a background asyncio loop crawls them, results show up on the next refresh
+# - Bounded: global + per-host concurrency, per-request timeout, byte cap, robots.txt
+# - Cached by canonical URL (tracking params / fragment stripped, <link rel=canonical> too)
+#
+# Goes through scanner.http_get, so record/replay and local stub sites work as upstream.
+#   python enrich.py check    # local stub site: live crawl, robots.txt, record -> replay
+
+import argparse
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urljoin, urlparse, urlunparse
+from urllib.robotparser import RobotFileParser
+
+import scanner
+
+
+# =========================
+# CONFIG
+# =========================
+ENRICH_ENABLED = os.getenv("NEWS_ENRICH", "").strip().lower() in ("1", "true", "yes", "on")
+
+ENRICH_MAX_CONCURRENCY = 8        # in-flight fetches, all hosts
+ENRICH_PER_HOST = 2               # in-flight fetches per host
+ENRICH_TIMEOUT_SECONDS = 6.0      # deadline per request (connect + whole body), robots.txt and page each
+ENRICH_MAX_BYTES = 512 * 1024     # stop reading the page after this
+ENRICH_MAX_CHARS = 1500           # lead paragraphs kept for scoring
+ENRICH_MAX_QUEUE = 200            # pending URLs; beyond that new misses are dropped
+ENRICH_CACHE_SIZE = 5000          # canonical URLs kept (LRU)
+ENRICH_FAIL_TTL_SECONDS = 15 * 60 # retry failed URLs after this
+ROBOTS_TTL_SECONDS = 6 * 3600
+
+# Redirectors / aggregators whose pages are not the article
+SKIP_HOSTS = ["news.google.com"]
+
+TRACKING_PARAMS = re.compile(r"^(utm_\w+|fbclid|gclid|mc_cid|mc_eid|ocid|cmpid|taid|mod|ref)$", re.IGNORECASE)
+
+
+# =========================
+# URL + TEXT HELPERS
+# =========================
+def canonical_url(url: str) -> str:
+    try:
+        u = urlparse((url or "").strip())
+    except Exception:
+        return ""
+    if u.scheme not in ("http", "https") or not u.netloc:
+        return ""
+    host = u.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = urlencode([(k, v) for k, v in parse_qsl(u.query, keep_blank_values=True) if not TRACKING_PARAMS.match(k)])
+    path = u.path.rstrip("/") or "/"
+    return urlunparse(("https", host, path, "", query, ""))
+
+
+class _LeadExtractor(HTMLParser):
+    """Collects <p> text outside script/style/nav/header/footer/aside, plus canonical + meta description."""
+
+    SKIP = {"script", "style", "noscript", "nav", "header", "footer", "aside", "form", "figure"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.paragraphs: list[str] = []
+        self.canonical = ""
+        self.description = ""
+        self._skip = 0
+        self._in_p = False
+        self._buf: list[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        a = dict(attrs)
+        if tag in self.SKIP:
+            self._skip += 1
+        elif tag == "p" and not self._skip:
+            self._in_p = True
+            self._buf = []
+        elif tag == "link" and (a.get("rel") or "").lower() == "canonical":
+            self.canonical = a.get("href") or ""
+        elif tag == "meta" and (a.get("name") or a.get("property") or "").lower() in ("description", "og:description"):
+            self.description = self.description or (a.get("content") or "")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP and self._skip:
+            self._skip -= 1
+        elif tag == "p" and self._in_p:
+            self._in_p = False
+            text = re.sub(r"\s+", " ", "".join(self._buf)).strip()
+            if len(text) >= 40:
+                self.paragraphs.append(text)
+
+    def handle_data(self, data):
+        if self._in_p and not self._skip:
+            self._buf.append(data)
+
+
+def extract_lead(html_text: str, max_chars: int = ENRICH_MAX_CHARS) -> tuple[str, str]:
+    """Returns (lead text, canonical href). Falls back to the meta description."""
+    p = _LeadExtractor()
+    try:
+        p.feed(html_text)
+        p.close()
+    except Exception:
+        pass
+
+    out, size = [], 0
+    for para in p.paragraphs:
+        out.append(para)
+        size += len(para) + 1
+        if size >= max_chars:
+            break
+    lead = "\n".join(out)[:max_chars] or p.description.strip()[:max_chars]
+    return lead, p.canonical
+
+
+# =========================
+# CRAWLER
+# =========================
+def _iter_available(r, size: int):
+    """Body chunks as they arrive (one socket read each), so a deadline can be checked between reads."""
+    read1 = getattr(r.raw, "read1", None)  # urllib3 >= 2
+    if r._content_consumed or read1 is None:
+        yield from r.iter_content(1024 if read1 is None else size)
+        return
+    while True:
+        chunk = read1(size, decode_content=True)
+        if not chunk:
+            return
+        yield chunk
+
+
+def read_body_capped(r, max_bytes: int, deadline: float) -> bytes:
+    """
+    Body of a stream=True response, up to max_bytes, raising TimeoutError past `deadline`
+    (time.monotonic()). requests' own timeout is per socket operation, so a server
+    trickling bytes is only cut off by this check. Also used by feedreplay.Recorder.
+    """
+    chunks, size = [], 0
+    for chunk in _iter_available(r, 16384):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= max_bytes:
+            break
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"enrich: {r.url} exceeded its deadline")
+    return b"".join(chunks)[:max_bytes]
+
+
+def _read_capped(url: str, max_bytes: int, timeout: float) -> tuple[int, str, bytes, str]:
+    """GET up to max_bytes within `timeout` seconds overall."""
+    deadline = time.monotonic() + timeout
+    r = scanner.http_get(url, headers=scanner.HEADERS, timeout=timeout, stream=True)
+    try:
+        ctype = r.headers.get("Content-Type", "")
+        return r.status_code, ctype, read_body_capped(r, max_bytes, deadline), r.url or url
+    finally:
+        r.close()
+
+
+class Enricher:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cache: OrderedDict[str, tuple[float, str]] = OrderedDict()  # canon -> (ts, text); "" = failed
+        self._pending: set[str] = set()
+        self._robots: dict[str, tuple[float, RobotFileParser | None]] = {}
+        self._host_sems: dict[str, asyncio.Semaphore] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._sem: asyncio.Semaphore | None = None
+        # Own pool: a slow fetch holds its worker (and its semaphores) until the thread returns
+        self._pool = ThreadPoolExecutor(max_workers=ENRICH_MAX_CONCURRENCY, thread_name_prefix="enrich-fetch")
+        self.stats = {"fetched": 0, "failed": 0, "robots_blocked": 0, "dropped": 0}
+
+    # --- cache ---
+    def get(self, url: str) -> str | None:
+        """Cached lead text, "" if it failed recently, None if unknown."""
+        canon = canonical_url(url)
+        if not canon:
+            return ""
+        with self._lock:
+            hit = self._cache.get(canon)
+            if hit is None:
+                return None
+            ts, text = hit
+            if not text and (time.time() - ts) > ENRICH_FAIL_TTL_SECONDS:
+                del self._cache[canon]
+                return None
+            self._cache.move_to_end(canon)
+            return text
+
+    def _put(self, canon: str, text: str) -> None:
+        with self._lock:
+            self._cache[canon] = (time.time(), text)
+            self._cache.move_to_end(canon)
+            while len(self._cache) > ENRICH_CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+    # --- queue ---
+    def submit(self, url: str) -> None:
+        canon = canonical_url(url)
+        if not canon or urlparse(canon).netloc in SKIP_HOSTS:
+            return
+        with self._lock:
+            if canon in self._pending or canon in self._cache:
+                return
+            if len(self._pending) >= ENRICH_MAX_QUEUE:
+                self.stats["dropped"] += 1
+                return
+            self._pending.add(canon)
+        self._ensure_loop()
+        asyncio.run_coroutine_threadsafe(self._crawl(url, canon), self._loop)
+
+    def _ensure_loop(self) -> None:
+        with self._lock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="enrich-loop", daemon=True).start()
+            self._loop = loop
+            self._sem = asyncio.Semaphore(ENRICH_MAX_CONCURRENCY)
+
+    # --- robots ---
+    def _robots_allowed(self, url: str) -> bool:
+        u = urlparse(url)
+        key = f"{u.scheme}://{u.netloc}"
+        cached = self._robots.get(key)
+        if cached is None or (time.time() - cached[0]) > ROBOTS_TTL_SECONDS:
+            rp = None
+            try:
+                status, _, body, _ = _read_capped(key + "/robots.txt", 64 * 1024, ENRICH_TIMEOUT_SECONDS)
+                if status == 200:
+                    rp = RobotFileParser()
+                    rp.parse(body.decode("utf-8", "replace").splitlines())
+            except Exception:
+                rp = None  # unreachable robots.txt -> allowed
+            cached = (time.time(), rp)
+            self._robots[key] = cached
+        rp = cached[1]
+        return rp is None or rp.can_fetch(scanner.HEADERS["User-Agent"], url)
+
+    def _fetch_lead(self, url: str) -> tuple[str, str]:
+        if not self._robots_allowed(url):
+            self.stats["robots_blocked"] += 1
+            return "", ""
+        status, ctype, body, final_url = _read_capped(url, ENRICH_MAX_BYTES, ENRICH_TIMEOUT_SECONDS)
+        if status != 200 or "html" not in ctype.lower():
+            return "", final_url
+        lead, canonical = extract_lead(body.decode("utf-8", "replace"))
+        return lead, urljoin(final_url, canonical) if canonical else final_url
+
+    async def _crawl(self, url: str, canon: str) -> None:
+        host = urlparse(canon).netloc
+        host_sem = self._host_sems.setdefault(host, asyncio.Semaphore(ENRICH_PER_HOST))
+        text, final = "", ""
+        try:
+            # No wait_for: cancelling the await would free both slots while the thread keeps
+            # running. The thread ends by itself (deadline in _read_capped), then slots are released.
+            async with self._sem, host_sem:
+                text, final = await asyncio.get_running_loop().run_in_executor(self._pool, self._fetch_lead, url)
+        except Exception:
+            text = ""
+        finally:
+            self.stats["fetched" if text else "failed"] += 1
+            self._put(canon, text)
+            other = canonical_url(final)
+            if text and other and other != canon:
+                self._put(other, text)
+            with self._lock:
+                self._pending.discard(canon)
+
+
+_enricher: Enricher | None = None
+
+
+def get_enricher() -> Enricher:
+    global _enricher
+    if _enricher is None:
+        _enricher = Enricher()
+    return _enricher
+
+
+def enrich_items(items: list[dict]) -> list[dict]:
+    """Non-blocking: attach cached lead text as item["body"], queue the rest for the next refresh."""
+    e = get_enricher()
+    out = []
+    for a in items:
+        link = a.get("link") or ""
+        text = e.get(link)
+        if text is None:
+            e.submit(link)
+        if text:
+            a = dict(a)
+            a["body"] = text
+            a.pop("_body_text", None)  # re-normalized with the new body
+        out.append(a)
+    return out
+
+
+# =========================
+# STUB SITE CHECK
+# =========================
+STUB_PAGES = {
+    "/robots.txt": ("text/plain", "User-agent: *\nDisallow: /private\n"),
+    "/a": ("text/html", "<html><nav>menu</nav><p>Treasury auction tails as bid-to-cover drops to the weakest since March.</p></html>"),
+    "/b": ("text/html", "<html><p>Dealers short gamma into the 0DTE expiry, repo rates and SOFR drift higher.</p></html>"),
+    "/private": ("text/html", "<html><p>This page is disallowed by robots.txt and must never be fetched.</p></html>"),
+}
+
+
+class _StubSiteHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/slow":
+            # trickles one paragraph over ~10s: must be cut off at ENRICH_TIMEOUT_SECONDS
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.end_headers()
+            try:
+                for _ in range(100):
+                    self.wfile.write(b"<p>slow ")
+                    self.wfile.flush()
+                    time.sleep(0.1)
+            except OSError:
+                pass
+            return
+        page = STUB_PAGES.get(self.path)
+        if page is None:
+            self.send_error(404)
+            return
+        body = page[1].encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", page[0])
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _drain(e: Enricher, items: list[dict], timeout: float = 15.0) -> list[dict]:
+    """enrich_items() once to queue, wait for the crawler, then again to pick up the cache."""
+    enrich_items(items)
+    deadline = time.monotonic() + timeout
+    while e._pending and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return enrich_items(items)
+
+
+def check_stub_site() -> list[str]:
+    """Live crawl of a local stub site through a Recorder, then the same pages under a stepped replay."""
+    global _enricher, ENRICH_TIMEOUT_SECONDS
+    import feedreplay  # imports this module
+
+    failures = []
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _StubSiteHandler)
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{srv.server_address[1]}"
+    items = [{"link": f"{base}{p}", "title": p} for p in ("/a", "/b", "/private")]
+    path = os.path.join(os.getenv("TMPDIR", "/tmp"), f"enrich_check_{os.getpid()}.jsonl.gz")
+    timeout_was = ENRICH_TIMEOUT_SECONDS
+
+    try:
+        # live, recorded
+        rec = feedreplay.Recorder(path)
+        scanner.set_transport(rec)
+        feed_t = time.time()
+        _enricher = Enricher()
+        live = {a["title"]: a.get("body", "") for a in _drain(_enricher, items)}
+        # a trickling page is cut off at the deadline while recording, too
+        ENRICH_TIMEOUT_SECONDS = 1.0
+        t0 = time.monotonic()
+        slow = _drain(_enricher, [{"link": f"{base}/slow", "title": "/slow"}])[0].get("body", "")
+        took = time.monotonic() - t0
+        ENRICH_TIMEOUT_SECONDS = timeout_was
+        rec.close()
+        if slow or took > 4 * 1.0:
+            failures.append(f"live: /slow not cut off at the deadline (body {slow!r}, {took:.1f}s)")
+        if not live["/a"] or not live["/b"] or live["/a"] == live["/b"]:
+            failures.append(f"live: expected two distinct leads, got {live}")
+        if live["/private"] or not _enricher.stats["robots_blocked"]:
+            failures.append(f"live: /private not blocked by robots.txt ({_enricher.stats})")
+
+        # replay: clock parked on the feed poll that listed the pages (recorded before them)
+        feed = {"t": feed_t, "source": "bing", "url": "", "status": 200, "content_type": "application/json", "body": ""}
+        stub = feedreplay.ReplayStub([feed] + feedreplay.load_archive(path), speed=0)
+        stub.install()
+        stub.seek(feed_t)
+        _enricher = Enricher()
+        replayed = {a["title"]: a.get("body", "") for a in _drain(_enricher, items)}
+        if replayed != live:
+            failures.append(f"replay: bodies differ from live ({replayed} vs {live}, stats {_enricher.stats})")
+    finally:
+        ENRICH_TIMEOUT_SECONDS = timeout_was
+        scanner.set_transport()
+        scanner.set_clock()
+        _enricher = None
+        srv.shutdown()
+        if os.path.exists(path):
+            os.remove(path)
+    return failures
+
+
+def main(argv=None) -> None:
+    p = argparse.ArgumentParser(description="Article enrichment")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("check", help="crawl + record/replay against a local stub site")
+    p.parse_args(argv)
+
+    failures = check_stub_site()
+    for f in failures:
+        print("FAIL", f)
+    print("stub site check:", "FAIL" if failures else "OK")
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
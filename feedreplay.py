@@ -0,0 +1,434 @@
+# feedreplay.py
+# Record / replay harness for the upstream feeds (Google RSS + Bing News)
+#
+# Record (live network, every raw upstream response is archived with its timestamp):
+#   python feedreplay.py record fomc_day.jsonl.gz --minutes 240
+#   NEWS_RECORD_PATH=fomc_day.jsonl.gz streamlit run app.py
+#
+# Replay (no network, same fetch code, virtual clock):
+#   python feedreplay.py replay fomc_day.jsonl.gz --speed 50
+#   NEWS_REPLAY_PATH=fomc_day.jsonl.gz NEWS_REPLAY_SPEED=50 streamlit run app.py
+#
+# Stub upstream over HTTP (other processes, e.g. loadtest.py):
+#   python feedreplay.py serve fomc_day.jsonl.gz --port 8765 --speed 50
+#   -> prints the GOOGLE_NEWS_RSS / BING_NEWS_ENDPOINT / NEWS_REPLAY_CLOCK env to run app.py with
+#
+# Archive format: gzip JSON lines, one upstream response per line:
+#   {"t": <unix ts>, "source": "google"|"bing"|<page url>, "url": ..., "status": 200,
+#    "content_type": ..., "body": <base64 raw bytes>}
+#
+# The CLI replay steps the virtual clock in fixed ticks (one auto-refresh each),
+# so the digest it prints is identical at 1x, 50x or --speed 0 (no pacing).
+
+import argparse
+import atexit
+import base64
+import bisect
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import requests
+
+import scanner
+from enrich import ENRICH_MAX_BYTES, read_body_capped
+
+
+# =========================
+# ARCHIVE
+# =========================
+# Feeds are matched on path so the real hosts and a local stub (127.0.0.1:port) map the same way;
+# anything else (enrich.py article pages, robots.txt) is keyed by its full URL
+GOOGLE_PATH = "/rss/search"
+BING_PATH = "/v7.0/news/search"
+
+
+def _source_of(url: str) -> str:
+    u = urlparse(url)
+    if u.path == GOOGLE_PATH:
+        return "google"
+    if u.path == BING_PATH:
+        return "bing"
+    key = f"{u.scheme}://{(u.netloc or '').lower()}{u.path or '/'}"
+    return f"{key}?{u.query}" if u.query else key
+
+
+def load_archive(path: str) -> list[dict]:
+    """
+    Every complete record in the archive. A recording whose process was killed has
+    no gzip trailer (and maybe a cut-off last line): keep what was read up to there.
+    """
+    records = []
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        try:
+            for line in fh:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break  # last line cut off mid-write
+        except (EOFError, gzip.BadGzipFile):
+            pass
+    records.sort(key=lambda r: r["t"])
+    return records
+
+
+class Recorder:
+    """
+    Transport for scanner.set_transport(): performs the real GET and appends the
+    raw response to a gzip archive. Request headers (API keys) are never written.
+    Streamed GETs (enrich.py) are read up to max_bytes, within the request's `timeout` overall
+    (same deadline as enrich._read_capped), and the caller gets that capped body.
+    """
+
+    def __init__(self, path: str, transport=requests.get, max_bytes: int = ENRICH_MAX_BYTES):
+        self.path = path
+        self._transport = transport
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._fh = gzip.open(path, "at", encoding="utf-8")
+        self.count = 0
+
+    def __call__(self, url: str, **kwargs):
+        timeout = kwargs.get("timeout")
+        deadline = time.monotonic() + timeout if isinstance(timeout, (int, float)) else float("inf")
+        r = self._transport(url, **kwargs)
+        if kwargs.get("stream"):
+            try:
+                body = read_body_capped(r, self.max_bytes, deadline)  # TimeoutError: not recorded
+            finally:
+                r.close()
+            r._content = body
+            r._content_consumed = True
+        rec = {
+            "t": time.time(),
+            "source": _source_of(url),
+            "url": r.url or url,
+            "status": r.status_code,
+            "content_type": r.headers.get("Content-Type", ""),
+            "body": base64.b64encode(r.content or b"").decode("ascii"),
+        }
+        with self._lock:
+            self._fh.write(json.dumps(rec) + "\n")
+            self._fh.flush()
+            self.count += 1
+        return r
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._fh.closed:
+                self._fh.close()
+
+
+class ReplayStub:
+    """
+    Local stub upstream: answers each GET with the latest archived response for
+    that source at the current virtual time. Feed query strings are not matched,
+    so replay serves what was recorded whatever keywords are in the UI; other
+    URLs (article pages, robots.txt) must match exactly, and are served even
+    before their recording time.
+
+    Two clock modes:
+      - stepped (default): the caller moves time with seek()/ticks() -> deterministic
+      - live (start_live): virtual time = start + wall elapsed * speed
+        (wall clock based, so another process can follow it via NEWS_REPLAY_CLOCK)
+    """
+
+    def __init__(self, records: list[dict], speed: float = 1.0):
+        if not records:
+            raise ValueError("replay archive is empty")
+        self.records = records
+        self.speed = float(speed)
+        self.start_t = records[0]["t"]
+        self.end_t = records[-1]["t"]
+        self.requests = 0
+        self._lock = threading.Lock()
+
+        self._by_source: dict[str, list[dict]] = {}
+        for rec in records:
+            self._by_source.setdefault(rec["source"], []).append(rec)
+        self._ts = {src: [r["t"] for r in recs] for src, recs in self._by_source.items()}
+
+        self._now = self.start_t
+        self._wall0 = None
+
+    @classmethod
+    def load(cls, path: str, speed: float = 1.0) -> "ReplayStub":
+        return cls(load_archive(path), speed=speed)
+
+    # --- clock ---
+    def clock(self) -> float:
+        if self._wall0 is None:
+            return self._now
+        return _virtual_now(self.start_t, self.end_t, self.speed, self._wall0)
+
+    def start_live(self, wall0: float | None = None) -> None:
+        self._wall0 = time.time() if wall0 is None else float(wall0)
+
+    def clock_env(self) -> str:
+        """NEWS_REPLAY_CLOCK value for a process that fetches from this stub over HTTP."""
+        return f"{self.start_t}:{self.end_t}:{self.speed}:{self._wall0}"
+
+    def seek(self, t: float) -> None:
+        self._now = float(t)
+
+    def ticks(self, interval: float):
+        t = self.start_t
+        while t <= self.end_t:
+            self.seek(t)
+            yield t
+            t += interval
+
+    # --- transport ---
+    def lookup(self, source: str) -> dict:
+        recs = self._by_source.get(source)
+        if not recs:
+            raise requests.ConnectionError(f"replay: nothing recorded for {source}")
+
+        idx = bisect.bisect_right(self._ts[source], self.clock()) - 1
+        if idx < 0 and source not in ("google", "bing"):
+            # Pages / robots.txt are recorded after the feed poll that listed them,
+            # so the crawler asks for them "early": serve the first recording
+            idx = 0
+        if idx < 0:
+            raise requests.ConnectionError(f"replay: no {source} response recorded yet")
+
+        with self._lock:
+            self.requests += 1
+        return recs[idx]
+
+    def has_source(self, source: str) -> bool:
+        return source in self._by_source
+
+    def __call__(self, url: str, **kwargs) -> requests.Response:
+        rec = self.lookup(_source_of(url))
+
+        r = requests.Response()
+        r.status_code = int(rec.get("status", 200))
+        r._content = base64.b64decode(rec.get("body", ""))
+        r._content_consumed = True  # iter_content() / close() must not touch r.raw (None)
+        r.headers["Content-Type"] = rec.get("content_type", "")
+        r.url = rec.get("url", url)
+        r.encoding = "utf-8"
+        return r
+
+    def install(self) -> None:
+        scanner.set_transport(self)
+        scanner.set_clock(self.clock)
+        # fetch_bing_news() bails out without a key; the archive does not need one
+        if self.has_source("bing") and not scanner.BING_API_KEY:
+            scanner.BING_API_KEY = "replay"
+
+
+def _virtual_now(start_t: float, end_t: float, speed: float, wall0: float) -> float:
+    elapsed = (time.time() - wall0) * max(speed, 0.0)
+    return min(end_t, start_t + elapsed)
+
+
+class StubServer:
+    """Serves a ReplayStub over HTTP on the Google RSS / Bing paths (503 until something was recorded)."""
+
+    def __init__(self, stub: ReplayStub, host: str = "127.0.0.1", port: int = 0):
+        self.stub = stub
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                try:
+                    rec = stub.lookup(_source_of(self.path))
+                except requests.ConnectionError as e:
+                    self.send_error(503, str(e))
+                    return
+                body = base64.b64decode(rec.get("body", ""))
+                self.send_response(int(rec.get("status", 200)))
+                self.send_header("Content-Type", rec.get("content_type", ""))
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def app_env(self) -> dict:
+        """Env for an app.py process that should fetch from this stub instead of the real feeds."""
+        google_query = urlparse(scanner.GOOGLE_NEWS_RSS).query
+        env = {
+            "GOOGLE_NEWS_RSS": f"{self.base_url}{GOOGLE_PATH}?{google_query}",
+            "BING_NEWS_ENDPOINT": f"{self.base_url}{BING_PATH}",
+            "NEWS_REPLAY_CLOCK": self.stub.clock_env(),
+        }
+        if self.stub.has_source("bing"):
+            env["BING_NEWS_API_KEY"] = "replay"
+        return env
+
+    def start(self) -> "StubServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+_installed = None
+
+
+def install_from_env():
+    """
+    Hook for app.py, idempotent across reruns:
+      NEWS_REPLAY_PATH   -> in-process ReplayStub (wins over recording)
+      NEWS_RECORD_PATH   -> Recorder around the real network
+      NEWS_REPLAY_CLOCK  -> only follow the virtual clock of a StubServer
+    """
+    global _installed
+    if _installed is not None:
+        return _installed
+
+    replay_path = os.getenv("NEWS_REPLAY_PATH", "").strip()
+    record_path = os.getenv("NEWS_RECORD_PATH", "").strip()
+    replay_clock = os.getenv("NEWS_REPLAY_CLOCK", "").strip()
+
+    if replay_clock:
+        start_t, end_t, speed, wall0 = (float(x) for x in replay_clock.split(":"))
+        scanner.set_clock(lambda: _virtual_now(start_t, end_t, speed, wall0))
+        _installed = replay_clock
+
+    if replay_path:
+        stub = ReplayStub.load(replay_path, speed=float(os.getenv("NEWS_REPLAY_SPEED", "1") or 1))
+        stub.start_live()
+        stub.install()
+        _installed = stub
+    elif record_path:
+        rec = Recorder(record_path)
+        scanner.set_transport(rec)
+        atexit.register(rec.close)  # gzip trailer on a clean exit; load_archive copes without one
+        _installed = rec
+
+    return _installed
+
+
+# =========================
+# CLI
+# =========================
+def _pct(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    return s[min(len(s) - 1, int(round(q * (len(s) - 1))))]
+
+
+def cmd_record(args) -> None:
+    rec = Recorder(args.path)
+    scanner.set_transport(rec)
+    deadline = time.time() + args.minutes * 60 if args.minutes else None
+    try:
+        while deadline is None or time.time() < deadline:
+            items = scanner.run_pipeline(args.keywords, min_kw=args.min_kw, max_noise=args.max_noise)
+            print(f"[record] {time.strftime('%H:%M:%S')} responses={rec.count} articles={len(items)}", flush=True)
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        rec.close()
+        scanner.set_transport(None)
+
+
+def cmd_serve(args) -> None:
+    stub = ReplayStub.load(args.path, speed=args.speed)
+    stub.start_live()
+    server = StubServer(stub, host=args.host, port=args.port).start()
+    for k, v in server.app_env().items():
+        print(f"export {k}='{v}'")
+    print(f"[serve] {server.base_url} speed={args.speed}x (Ctrl-C to stop)", flush=True)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+def cmd_replay(args) -> None:
+    stub = ReplayStub.load(args.path, speed=args.speed)
+    stub.install()
+
+    digest = hashlib.sha256()
+    lat_ms: list[float] = []
+    total_articles = 0
+    try:
+        for t in stub.ticks(args.interval):
+            t0 = time.perf_counter()
+            items = scanner.run_pipeline(args.keywords, min_kw=args.min_kw, max_noise=args.max_noise)
+            page = "".join(scanner.render_card_html(a) for a in items[:80])
+            elapsed = time.perf_counter() - t0
+
+            lat_ms.append(elapsed * 1000.0)
+            total_articles += len(items)
+            digest.update(f"{t:.3f}|{len(items)}|".encode())
+            digest.update(page.encode("utf-8"))
+
+            if args.verbose:
+                print(f"[replay] t={t:.0f} articles={len(items)} {elapsed * 1000.0:.1f}ms")
+
+            if args.speed > 0:
+                time.sleep(max(0.0, args.interval / args.speed - elapsed))
+    finally:
+        scanner.set_transport(None)
+        scanner.set_clock(None)
+
+    print(f"ticks={len(lat_ms)} span={stub.end_t - stub.start_t:.0f}s upstream_requests={stub.requests}")
+    print(f"articles={total_articles} p50={_pct(lat_ms, 0.50):.1f}ms p99={_pct(lat_ms, 0.99):.1f}ms")
+    print(f"digest={digest.hexdigest()}")
+
+
+def main(argv=None) -> None:
+    p = argparse.ArgumentParser(description="Record / replay upstream news feeds")
+    sub = p.add_subparsers(dest="cmd", required=True)
+
+    def common(sp):
+        sp.add_argument("path", help="archive (.jsonl.gz)")
+        sp.add_argument("--keywords", nargs="+", default=scanner.DEFAULT_KEYWORDS)
+        sp.add_argument("--interval", type=float, default=scanner.AUTO_REFRESH_SECONDS)
+        sp.add_argument("--min-kw", type=int, default=1)
+        sp.add_argument("--max-noise", type=int, default=0)
+
+    rec = sub.add_parser("record", help="poll the live feeds and archive raw responses")
+    common(rec)
+    rec.add_argument("--minutes", type=float, default=0, help="stop after N minutes (0 = until Ctrl-C)")
+    rec.set_defaults(func=cmd_record)
+
+    rep = sub.add_parser("replay", help="run the pipeline over an archive, offline")
+    common(rep)
+    rep.add_argument("--speed", type=float, default=1.0, help="1 = real time, 50 = 50x, 0 = no pacing")
+    rep.add_argument("-v", "--verbose", action="store_true")
+    rep.set_defaults(func=cmd_replay)
+
+    srv = sub.add_parser("serve", help="serve an archive over HTTP as a stub upstream")
+    srv.add_argument("path", help="archive (.jsonl.gz)")
+    srv.add_argument("--host", default="127.0.0.1")
+    srv.add_argument("--port", type=int, default=8765)
+    srv.add_argument("--speed", type=float, default=1.0)
+    srv.set_defaults(func=cmd_serve)
+
+    args = p.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
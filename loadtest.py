@@ -0,0 +1,396 @@
+# loadtest.py
+# Concurrent-session load test + capacity report for app.py
+#
+# Upstream is always a local stub (feedreplay.StubServer), never the real feeds.
+#
+#   # real Streamlit server, N websocket sessions each rerunning every --period seconds
+#   python loadtest.py fomc_day.jsonl.gz --sessions 1 5 10 25 50 --duration 120
+#
+#   # headless: N threads calling scanner.run_pipeline + render (no shared st cache = worst case)
+#   python loadtest.py fomc_day.jsonl.gz --mode pipeline --sessions 1 10 50
+#
+#   # no archive at hand: synthetic busy feed (60 minutes of 40-item RSS polls)
+#   python loadtest.py --synthetic 60 --sessions 1 10 --period 5 --duration 30 --csv capacity.csv
+#
+# Per step it reports: p50/p99 rerun (render) latency, server CPU% of one core,
+# RSS total + per session, upstream requests/s, and sessions/core extrapolated from CPU.
+# Linux only (/proc). App mode uses tornado's websocket client (ships with streamlit).
+
+import argparse
+import asyncio
+import base64
+import csv
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from email.utils import formatdate
+
+import feedreplay
+import scanner
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+
+# Never inherited by the app under test: its upstream is the stub only (no article
+# crawling of the synthetic links) and synthetic headlines must not reach real databases
+ISOLATED_ENV = ("NEWS_REPLAY_PATH", "NEWS_RECORD_PATH", "NEWS_ENRICH", "NEWS_ARCHIVE_DB", "NEWS_CLUSTER_DB")
+
+
+# =========================
+# PROCESS METRICS (/proc)
+# =========================
+def proc_rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as fh:
+        for line in fh:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024.0
+    return 0.0
+
+
+def proc_cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as fh:
+        # comm may contain spaces -> split after the closing paren
+        fields = fh.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / CLK_TCK
+
+
+def _pct(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    return s[min(len(s) - 1, int(round(q * (len(s) - 1))))]
+
+
+# =========================
+# SYNTHETIC UPSTREAM
+# =========================
+def synthetic_records(minutes: float, interval: float = 30.0, per_poll: int = 40) -> list[dict]:
+    """A busy macro afternoon: one Google RSS + one Bing poll per interval, fresh headlines each poll."""
+    topics = [
+        "Fed's Powell signals restrictive policy as FOMC minutes show rate path debate",
+        "Treasury 10-year auction tails, bid-to-cover weakest since March, people familiar with the matter said",
+        "Repo rates jump as SOFR spikes on funding stress, data showed",
+        "Dealers' negative gamma amplifies SPY selloff, 0DTE options volume at record",
+        "CPI hotter than expected; traders priced in fewer cuts, real yields climb",
+        "ECB and BOJ weigh balance sheet runoff as term premium rises",
+    ]
+    hosts = ["reuters.com", "bloomberg.com", "wsj.com", "cnbc.com", "seekingalpha.com", "prnewswire.com"]
+
+    end_t = time.time()
+    n_polls = max(1, int(minutes * 60 / interval))
+    start_t = end_t - n_polls * interval
+    records = []
+    for k in range(n_polls):
+        t = start_t + k * interval
+        items = []
+        for i in range(per_poll):
+            pub = t - i * 45
+            title = f"{topics[(k + i) % len(topics)]} ({int(pub) % 100000})"
+            host = hosts[(k + i) % len(hosts)]
+            items.append(
+                f"<item><title>{title}</title>"
+                f"<link>https://www.{host}/markets/{int(pub)}-{i}</link>"
+                f"<pubDate>{formatdate(pub)}</pubDate>"
+                f"<description>&lt;a href=&quot;https://www.{host}/&quot;&gt;{title}&lt;/a&gt;&amp;nbsp;"
+                f"&lt;font color=&quot;#6f6f6f&quot;&gt;{host}&lt;/font&gt;</description></item>"
+            )
+        rss = f'<?xml version="1.0"?><rss version="2.0"><channel><title>stub</title>{"".join(items)}</channel></rss>'
+        bing = {"value": [
+            {
+                "name": f"{topics[(k + i) % len(topics)]} [bing {int(t) - i * 60}]",
+                "url": f"https://www.{hosts[i % len(hosts)]}/b/{int(t)}-{i}",
+                "datePublished": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(t - i * 60)),
+            }
+            for i in range(25)
+        ]}
+        records.append({
+            "t": t, "source": "google", "url": scanner.GOOGLE_NEWS_RSS, "status": 200,
+            "content_type": "application/rss+xml",
+            "body": base64.b64encode(rss.encode("utf-8")).decode("ascii"),
+        })
+        records.append({
+            "t": t, "source": "bing", "url": scanner.BING_NEWS_ENDPOINT, "status": 200,
+            "content_type": "application/json",
+            "body": base64.b64encode(json.dumps(bing).encode("utf-8")).decode("ascii"),
+        })
+    return records
+
+
+# =========================
+# APP MODE (real Streamlit server + websocket sessions)
+# =========================
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(stub_env: dict, port: int) -> subprocess.Popen:
+    env = dict(os.environ)
+    for k in ISOLATED_ENV:
+        env.pop(k, None)
+    env.update(stub_env)
+
+    proc = subprocess.Popen(
+        [
+            sys.executable, "-m", "streamlit", "run", os.path.join(HERE, "app.py"),
+            f"--server.port={port}", "--server.address=127.0.0.1",
+            "--server.headless=true", "--server.enableXsrfProtection=false",
+            "--server.fileWatcherType=none", "--browser.gatherUsageStats=false",
+            "--logger.level=error",
+        ],
+        cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("streamlit exited during startup")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as r:
+                if r.status == 200:
+                    return proc
+        except OSError:
+            time.sleep(0.3)
+    proc.kill()
+    raise RuntimeError("streamlit did not become healthy within 60s")
+
+
+async def _rerun(ws) -> float:
+    from streamlit.proto.BackMsg_pb2 import BackMsg
+    from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+    msg = BackMsg()
+    msg.rerun_script.query_string = ""
+    t0 = time.perf_counter()
+    await ws.write_message(msg.SerializeToString(), binary=True)
+    while True:
+        raw = await ws.read_message()
+        if raw is None:
+            raise ConnectionError("session closed by server")
+        fwd = ForwardMsg()
+        fwd.ParseFromString(raw)
+        if fwd.WhichOneof("type") == "script_finished":
+            return (time.perf_counter() - t0) * 1000.0
+
+
+async def _drive_sessions(port: int, n: int, period: float, duration: float, on_warm) -> list[float]:
+    """
+    Open n sessions, render each once, then (all warm) call on_warm() and let every
+    session rerun once per period for duration seconds. Returns rerun latencies (ms).
+    """
+    from tornado.websocket import websocket_connect
+
+    url = f"ws://127.0.0.1:{port}/_stcore/stream"
+    lat_ms: list[float] = []
+    warm = asyncio.Event()
+    ready = 0
+    stop_at = 0.0
+
+    async def session(i: int):
+        nonlocal ready, stop_at
+        ws = await websocket_connect(url, subprotocols=["streamlit"])
+        try:
+            await _rerun(ws)  # first render: a desk opening the page, not measured
+            ready += 1
+            if ready == n:
+                on_warm()
+                stop_at = time.time() + duration
+                warm.set()
+            await warm.wait()
+
+            # Stagger across the period, like st_autorefresh ticks of independent desks
+            await asyncio.sleep(i * period / n)
+            while time.time() < stop_at:
+                took = await _rerun(ws)
+                lat_ms.append(took)
+                await asyncio.sleep(max(0.0, period - took / 1000.0))
+        finally:
+            ws.close()
+
+    await asyncio.gather(*(session(i) for i in range(n)))
+    return lat_ms
+
+
+class _RssSampler:
+    def __init__(self, pid: int, every: float = 0.5):
+        self.pid = pid
+        self.every = every
+        self.peak = proc_rss_mb(pid)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.every):
+            self.peak = max(self.peak, proc_rss_mb(self.pid))
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, proc_rss_mb(self.pid))
+
+
+def _summarize(n: int, lat_ms: list[float], cpu_s: float, wall_s: float, rss_base: float, rss_peak: float, upstream: int) -> dict:
+    cpu_pct = 100.0 * cpu_s / wall_s if wall_s > 0 else 0.0
+    return {
+        "sessions": n,
+        "reruns": len(lat_ms),
+        "p50_ms": round(_pct(lat_ms, 0.50), 1),
+        "p99_ms": round(_pct(lat_ms, 0.99), 1),
+        "cpu_pct": round(cpu_pct, 1),
+        "rss_mb": round(rss_peak, 1),
+        "rss_per_session_mb": round(max(0.0, rss_peak - rss_base) / n, 2),
+        "upstream_rps": round(upstream / wall_s, 3) if wall_s > 0 else 0.0,
+        "sessions_per_core": round(n * 100.0 / cpu_pct, 1) if cpu_pct > 0 else 0.0,
+    }
+
+
+def run_app_step(server: feedreplay.StubServer, n: int, period: float, duration: float) -> dict:
+    port = _free_port()
+    proc = start_server(server.app_env(), port)
+    try:
+        # Throwaway session so imports / first compile are not charged to the sessions
+        asyncio.run(_drive_sessions(port, 1, period, 0.0, lambda: None))
+        time.sleep(1.0)
+        rss_base = proc_rss_mb(proc.pid)
+
+        mark = {}
+
+        def on_warm():
+            mark.update(cpu=proc_cpu_seconds(proc.pid), wall=time.time(), upstream=server.stub.requests)
+
+        with _RssSampler(proc.pid) as rss:
+            lat_ms = asyncio.run(_drive_sessions(port, n, period, duration, on_warm))
+            cpu_s = proc_cpu_seconds(proc.pid) - mark["cpu"]
+            wall_s = time.time() - mark["wall"]
+            upstream = server.stub.requests - mark["upstream"]
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+    return _summarize(n, lat_ms, cpu_s, wall_s, rss_base, rss.peak, upstream)
+
+
+# =========================
+# PIPELINE MODE (headless, in-process)
+# =========================
+def run_pipeline_step(stub: feedreplay.ReplayStub, n: int, period: float, duration: float, keywords: list[str]) -> dict:
+    """Every session runs its own fetch -> score -> render (no shared cache): the worst case."""
+    pid = os.getpid()
+    rss_base = proc_rss_mb(pid)
+    lat_ms: list[float] = []
+    latest: list[list] = [[] for _ in range(n)]  # per-session "latest_news"
+    lock = threading.Lock()
+
+    cpu0, wall0, up0 = proc_cpu_seconds(pid), time.time(), stub.requests
+    stop_at = wall0 + duration
+
+    def session(i: int):
+        time.sleep(i * period / n)
+        while time.time() < stop_at:
+            t0 = time.perf_counter()
+            items = scanner.run_pipeline(keywords, min_kw=1, max_noise=0)
+            "".join(scanner.render_card_html(a) for a in items[:80])
+            latest[i] = items
+            took = time.perf_counter() - t0
+            with lock:
+                lat_ms.append(took * 1000.0)
+            time.sleep(max(0.0, period - took))
+
+    with _RssSampler(pid) as rss:
+        threads = [threading.Thread(target=session, args=(i,), daemon=True) for i in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    return _summarize(
+        n, lat_ms, proc_cpu_seconds(pid) - cpu0, time.time() - wall0,
+        rss_base, rss.peak, stub.requests - up0,
+    )
+
+
+# =========================
+# REPORT
+# =========================
+COLUMNS = ["sessions", "reruns", "p50_ms", "p99_ms", "cpu_pct", "rss_mb", "rss_per_session_mb", "upstream_rps", "sessions_per_core"]
+
+
+def print_report(rows: list[dict], mode: str, period: float) -> None:
+    print(f"\nCapacity curve ({mode} mode, one rerun per session every {period:g}s)")
+    print("  ".join(f"{c:>18}" for c in COLUMNS))
+    for row in rows:
+        print("  ".join(f"{row[c]:>18}" for c in COLUMNS))
+    print("sessions_per_core = sessions at 100% of one core, extrapolated from cpu_pct (size replicas with headroom)")
+
+
+def main(argv=None) -> None:
+    p = argparse.ArgumentParser(description="Concurrent-session load test for app.py against a stub upstream")
+    p.add_argument("archive", nargs="?", help="feedreplay archive (.jsonl.gz)")
+    p.add_argument("--synthetic", type=float, metavar="MINUTES", help="use a synthetic archive instead")
+    p.add_argument("--mode", choices=["app", "pipeline"], default="app")
+    p.add_argument("--sessions", type=int, nargs="+", default=[1, 5, 10, 25])
+    p.add_argument("--period", type=float, default=scanner.AUTO_REFRESH_SECONDS, help="seconds between reruns per session")
+    p.add_argument("--duration", type=float, default=60.0, help="measured seconds per step")
+    p.add_argument("--speed", type=float, default=1.0, help="replay speed of the stub upstream")
+    p.add_argument("--keywords", nargs="+", default=scanner.DEFAULT_KEYWORDS)
+    p.add_argument("--csv", help="also write the capacity curve here")
+    args = p.parse_args(argv)
+
+    if args.synthetic:
+        records = synthetic_records(args.synthetic)
+    elif args.archive:
+        records = feedreplay.load_archive(args.archive)
+    else:
+        p.error("give an archive or --synthetic MINUTES")
+
+    stub = feedreplay.ReplayStub(records, speed=args.speed)
+    stub.start_live()
+
+    rows = []
+    if args.mode == "app":
+        server = feedreplay.StubServer(stub).start()
+        try:
+            for n in args.sessions:
+                print(f"[app] {n} sessions ...", flush=True)
+                rows.append(run_app_step(server, n, args.period, args.duration))
+        finally:
+            server.stop()
+    else:
+        # Same isolation in-process: no enrichment crawl, no archive writes
+        import archive
+        import enrich
+        enrich.ENRICH_ENABLED = False
+        archive.ARCHIVE_ENABLED = False
+        stub.install()
+        try:
+            for n in args.sessions:
+                print(f"[pipeline] {n} sessions ...", flush=True)
+                rows.append(run_pipeline_step(stub, n, args.period, args.duration, args.keywords))
+        finally:
+            scanner.set_transport(None)
+            scanner.set_clock(None)
+
+    print_report(rows, args.mode, args.period)
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as fh:
+            w = csv.DictWriter(fh, fieldnames=COLUMNS)
+            w.writeheader()
+            w.writerows(rows)
+
+
+if __name__ == "__main__":
+    main()
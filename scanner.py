@@ -0,0 +1,698 @@
+# scanner.py
+# Scanner pipeline for app.py — everything that does not need Streamlit:
+# - Config + keyword lists + Bloomberg scoring layers
+# - Google RSS / Bing fetchers (through a swappable HTTP transport)
+# - dedupe -> filter -> score -> sort pipeline + card rendering
+#
+# app.py imports from here; feedreplay.py drives it headless.
+
+import hashlib
+import html
+import os
+import re
+import threading
+import time
+import tomllib
+import unicodedata
+from collections import OrderedDict
+from datetime import timezone
+from functools import lru_cache
+from urllib.parse import quote, urlparse
+
+import requests
+from dateutil import parser as date_parser
+
+
+# =========================
+# CONFIG
+# =========================
+AUTO_REFRESH_SECONDS = 30
+
+# Hard cutoff: only keep articles within last X hours
+MAX_ARTICLE_AGE_HOURS = 24
+
+# Good default (you can paste your bigger Bloomberg keyword preset in the UI input)
+DEFAULT_KEYWORDS = ["SPY", "FOMC", "Treasury", "yields", "inflation", "options", "gamma", "liquidity"]
+
+# Overridable so a local stub upstream can stand in (feedreplay.py serve / loadtest.py)
+GOOGLE_NEWS_RSS = os.getenv("GOOGLE_NEWS_RSS", "https://news.google.com/rss/search?q={q}&hl=en-US&gl=US&ceid=US:en")
+BING_NEWS_ENDPOINT = os.getenv("BING_NEWS_ENDPOINT", "https://api.bing.microsoft.com/v7.0/news/search")
+
+HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120 Safari/537.36"
+    )
+}
+
+BING_API_KEY = os.getenv("BING_NEWS_API_KEY", "").strip()
+
+
+# =========================
+# QUERY ANTI-NOISE
+# =========================
+# Filter + scoring lists and weights live in scoring_rules.toml (see SCORING RULES below)
+# Anti-noise terms specifically for the word “options”
+NEGATIVE_KEYWORDS = [
+    # sports
+    "quarterback", "broncos", "giants", "nfl", "nba", "mlb", "nhl", "soccer", "football",
+    # travel / visas / airlines
+    "rebooking", "flight", "flights", "airline", "visa",
+    # lifestyle
+    "brain", "learning", "health", "fitness",
+]
+
+
+# =========================
+# UPSTREAM TRANSPORT + CLOCK
+# =========================
+# Fetchers never call requests directly: record/replay (feedreplay.py) swaps
+# these so the same fetch code runs against an archive with a virtual clock.
+_transport = requests.get
+_clock = time.time
+
+
+def set_transport(fn=None) -> None:
+    """Route upstream GETs through fn(url, **kwargs); None restores requests.get."""
+    global _transport
+    _transport = fn or requests.get
+
+
+def set_clock(fn=None) -> None:
+    """Use fn() as "now" for age cutoffs and time_ago; None restores time.time."""
+    global _clock
+    _clock = fn or time.time
+
+
+def http_get(url: str, **kwargs):
+    return _transport(url, **kwargs)
+
+
+def clock() -> float:
+    return _clock()
+
+
+# =========================
+# HELPERS
+# =========================
+def safe_parse_time(value: str) -> float:
+    if not value:
+        return 0.0
+    try:
+        dt = date_parser.parse(value)
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return dt.timestamp()
+    except Exception:
+        return 0.0
+
+
+def time_ago(ts_seconds: float) -> str:
+    now = clock()
+    diff = max(0, now - ts_seconds)
+    if diff < 60:
+        return f"{int(diff)}s"
+    if diff < 3600:
+        return f"{int(diff // 60)}m"
+    return f"{int(diff // 3600)}h"
+
+
+_TAG_RE = re.compile(r"<[^>]*>")
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Strip HTML tags, unescape entities, NFKC, casefold, collapse whitespace."""
+    if not text:
+        return ""
+    s = _TAG_RE.sub(" ", text)
+    s = html.unescape(s)
+    s = unicodedata.normalize("NFKC", s).casefold()
+    return _WS_RE.sub(" ", s).strip()
+
+
+def normalize_item(a: dict) -> dict:
+    """
+    Normalization stage, once per article (in place, idempotent):
+    - a["_text"]      -> title + summary (Google summary is HTML)
+    - a["_body_text"] -> enriched lead, "" if none
+    Every filter / scorer matches against these instead of re-lowercasing.
+    """
+    if "_text" not in a:
+        a["_text"] = f"{normalize_text(a.get('title') or '')}\n{normalize_text(a.get('summary') or '')}"
+    if "_body_text" not in a:
+        a["_body_text"] = normalize_text(a.get("body") or "")
+    return a
+
+
+@lru_cache(maxsize=256)
+def _keyword_matchers(keywords: tuple[str, ...]) -> tuple:
+    """(normalized keyword, matcher) pairs; matcher is a phrase str or a word-boundary regex."""
+    out = []
+    for kw in keywords:
+        k = normalize_text(kw)
+        if not k:
+            continue
+
+        # If keyword contains spaces or hyphen, do a simple substring match (phrase match)
+        # Example: "jobless claims", "10-year"
+        if (" " in k) or ("-" in k):
+            out.append((k, k))
+            continue
+
+        # Single token: match as whole word
+        # Example: "fed" should not match "defeated"
+        out.append((k, re.compile(r"\b" + re.escape(k) + r"\b")))
+    return tuple(out)
+
+
+def _hit(text: str, m) -> bool:
+    if isinstance(m, str):
+        return m in text
+    return m.search(text) is not None
+
+
+def _count_matchers(text: str, matchers: tuple) -> int:
+    hits = 0
+    for _, m in matchers:
+        if _hit(text, m):
+            hits += 1
+    return hits
+
+
+def count_hits(text: str, keywords: list[str]) -> int:
+    """
+    Bloomberg-style matching:
+    - Avoid substring false-positives by using word boundaries when possible
+    - Still supports multi-word phrases (e.g., 'jobless claims', 'real yield')
+    text must already be normalized (normalize_text / normalize_item); keywords
+    are normalized and compiled once per keyword list.
+    """
+    return _count_matchers(text or "", _keyword_matchers(tuple(keywords)))
+
+
+def matched_terms(text: str, keywords: list[str]) -> list[str]:
+    """Same matching as count_hits, but returns which (normalized) keywords hit."""
+    s = text or ""
+    return [k for k, m in _keyword_matchers(tuple(keywords)) if _hit(s, m)]
+
+
+def dedupe(items: list[dict]) -> list[dict]:
+    seen = set()
+    out = []
+    for a in items:
+        link = (a.get("link") or "").strip()
+        if link:
+            key = ("link", link)
+        else:
+            t = re.sub(r"\s+", " ", (a.get("title") or "").strip().lower())
+            key = ("title", t[:240])
+
+        if key in seen:
+            continue
+        seen.add(key)
+        out.append(a)
+    return out
+
+
+def filter_institutional(items: list[dict], min_kw: int, max_noise: int, plan: "RulePlan | None" = None) -> list[dict]:
+    plan = plan or get_rule_plan()
+    out = []
+    now_ts = clock()
+    max_age_sec = float(MAX_ARTICLE_AGE_HOURS) * 3600.0
+
+    for a in items:
+        title = (a.get("title") or "").strip()
+        if len(title) < 5:
+            continue
+
+        ts = float(a.get("_ts") or 0.0)
+        if ts <= 0:
+            continue
+
+        if (now_ts - ts) > max_age_sec:
+            continue
+
+        normalize_item(a)
+        text, body = a["_text"], a["_body_text"]
+
+        # HARD BLOCK (kills most "options" garbage) + institutional / noise hits
+        blocked, kw_hits, noise_hits = _memo(
+            ("filter", plan.digest, text, body),
+            lambda: plan.filter_hits(text, body),
+        )
+        if blocked:
+            continue
+
+        if kw_hits >= min_kw and noise_hits <= max_noise:
+            b = dict(a)
+            b["_kw_hits"] = kw_hits
+            b["_noise_hits"] = noise_hits
+            out.append(b)
+
+    return out
+
+
+def _extract_domain(url: str) -> str:
+    try:
+        host = (urlparse(url).netloc or "").lower()
+        return host.replace("www.", "")
+    except Exception:
+        return ""
+
+
+def _domain_in(domain: str, patterns: list[str]) -> bool:
+    if not domain:
+        return False
+    return any(p in domain for p in patterns)
+
+
+def score_bloomberg(item: dict, plan: "RulePlan | None" = None) -> dict:
+    plan = plan or get_rule_plan()
+    normalize_item(item)
+
+    out = dict(item)
+    out["_domain"] = _extract_domain(item.get("link") or "")
+
+    key = (
+        "score", plan.digest, out["_text"], out["_body_text"], out["_domain"],
+        int(out.get("_kw_hits", 0)), int(out.get("_noise_hits", 0)),
+    )
+    score, reasons = _memo(key, lambda: plan.score(out))
+
+    out["_score"] = score
+    out["_reasons"] = " ".join(reasons)
+    return out
+
+
+# =========================
+# SCORING RULES (scoring_rules.toml -> compiled plan, hot-reloaded)
+# =========================
+RULES_PATH = os.getenv("NEWS_RULES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "scoring_rules.toml"))
+RULES_CHECK_SECONDS = 2.0   # how often the rules file's mtime is checked
+RULES_MEMO_SIZE = 20000     # memoized filter / score results, keyed by plan digest
+
+RULE_KINDS = ("hits", "filter_hits", "domain")
+
+
+class RulePlan:
+    """
+    scoring_rules.toml compiled once: keyword matchers, hard-block regex and the
+    ordered rule steps. Keeps per-rule counters (evaluations, fires, hits, time).
+    """
+
+    FILTER_STEPS = ["filter.hard_block", "filter.institutional", "filter.noise"]
+
+    def __init__(self, cfg: dict, digest: str):
+        self.version = str(cfg.get("version") or "")
+        if not self.version:
+            raise ValueError("rules: 'version' is required")
+        self.digest = digest
+
+        lists = cfg.get("lists") or {}
+
+        def lst(name, where) -> list[str]:
+            if name not in lists:
+                raise ValueError(f"rules: {where} refers to unknown list '{name}'")
+            return list(lists[name])
+
+        score = cfg.get("score") or {}
+        self.score_min = int(score.get("min", -50))
+        self.score_max = int(score.get("max", 100))
+        self.max_reasons = int(score.get("max_reasons", 6))
+
+        filt = cfg.get("filter") or {}
+        self.institutional_terms = tuple(lst(filt.get("institutional", "institutional"), "filter.institutional"))
+        self.institutional = _keyword_matchers(self.institutional_terms)
+        self.noise = _keyword_matchers(tuple(lst(filt.get("noise", "noise"), "filter.noise")))
+        hard = [w for w in (normalize_text(x) for x in lst(filt.get("hard_block", "hard_block"), "filter.hard_block")) if w]
+        # One compiled regex (faster + cleaner)
+        self.hard_block_re = re.compile(r"\b(" + "|".join(map(re.escape, hard)) + r")\b") if hard else None
+
+        self.steps: list[dict] = []
+        for i, r in enumerate(cfg.get("rule") or []):
+            name = str(r.get("name") or f"rule{i}")
+            kind = r.get("kind")
+            if kind not in RULE_KINDS:
+                raise ValueError(f"rules: rule '{name}' has unknown kind {kind!r} (expected one of {RULE_KINDS})")
+
+            step = {"name": name, "kind": kind, "label": str(r.get("label", name))}
+            if kind == "hits":
+                text = r.get("text", "headline")
+                if text not in ("headline", "full"):
+                    raise ValueError(f"rules: rule '{name}' text must be 'headline' or 'full'")
+                step["matchers"] = _keyword_matchers(tuple(lst(r.get("list"), f"rule '{name}'")))
+                step["full"] = text == "full"
+            elif kind == "filter_hits":
+                field = r.get("field")
+                if field not in ("kw", "noise"):
+                    raise ValueError(f"rules: rule '{name}' field must be 'kw' or 'noise'")
+                step["field"] = "_kw_hits" if field == "kw" else "_noise_hits"
+            else:
+                step["patterns"] = lst(r.get("list"), f"rule '{name}'")
+                step["points"] = int(r.get("points", 0))
+
+            if kind != "domain":
+                if "per_hit" not in r:
+                    raise ValueError(f"rules: rule '{name}' needs per_hit")
+                step["per_hit"] = int(r["per_hit"])
+                step["cap"] = abs(int(r.get("cap", 100)))
+            self.steps.append(step)
+
+        names = self.FILTER_STEPS + [st["name"] for st in self.steps]
+        if len(set(names)) != len(names):
+            raise ValueError("rules: rule names must be unique")
+        self.stats = {n: {"evals": 0, "fired": 0, "hits": 0, "ns": 0} for n in names}
+        self._stats_lock = threading.Lock()
+
+    def _record(self, local: list[tuple[str, int, int]]) -> None:
+        with self._stats_lock:
+            for name, hits, ns in local:
+                st = self.stats[name]
+                st["evals"] += 1
+                st["hits"] += hits
+                st["ns"] += ns
+                if hits:
+                    st["fired"] += 1
+
+    def filter_hits(self, text: str, body: str) -> tuple[bool, int, int]:
+        """(hard blocked, institutional hits on text + lead, noise hits on text)."""
+        local = []
+        t0 = time.perf_counter_ns()
+        blocked = bool(self.hard_block_re and self.hard_block_re.search(text))
+        local.append(("filter.hard_block", int(blocked), time.perf_counter_ns() - t0))
+        if blocked:
+            self._record(local)
+            return True, 0, 0
+
+        # Institutional terms may also come from the enriched lead (enrich.py); noise stays headline-level
+        t0 = time.perf_counter_ns()
+        kw_hits = _count_matchers(f"{text}\n{body}" if body else text, self.institutional)
+        local.append(("filter.institutional", kw_hits, time.perf_counter_ns() - t0))
+
+        t0 = time.perf_counter_ns()
+        noise_hits = _count_matchers(text, self.noise)
+        local.append(("filter.noise", noise_hits, time.perf_counter_ns() - t0))
+
+        self._record(local)
+        return False, kw_hits, noise_hits
+
+    def score(self, item: dict) -> tuple[int, tuple[str, ...]]:
+        text, body = item["_text"], item["_body_text"]
+        full = f"{text}\n{body}" if body else text
+        domain = item.get("_domain", "")
+
+        score = 0
+        reasons = []
+        local = []
+        for step in self.steps:
+            t0 = time.perf_counter_ns()
+            kind = step["kind"]
+            if kind == "domain":
+                hits = int(_domain_in(domain, step["patterns"]))
+                add = step["points"]
+                reason = step["label"]
+            else:
+                if kind == "hits":
+                    hits = _count_matchers(full if step["full"] else text, step["matchers"])
+                else:
+                    hits = int(item.get(step["field"], 0))
+                add = max(-step["cap"], min(step["cap"], hits * step["per_hit"]))
+                reason = f"{step['label']}({hits})"
+            if hits:
+                score += add
+                reasons.append(reason)
+            local.append((step["name"], hits, time.perf_counter_ns() - t0))
+
+        self._record(local)
+        score = max(self.score_min, min(self.score_max, score))
+        return score, tuple(reasons[: self.max_reasons])
+
+
+def load_rule_plan(path: str | None = None) -> RulePlan:
+    with open(path or RULES_PATH, "rb") as fh:
+        raw = fh.read()
+    cfg = tomllib.loads(raw.decode("utf-8"))
+    return RulePlan(cfg, hashlib.sha256(raw).hexdigest()[:12])
+
+
+_plan: RulePlan | None = None
+_plan_sig = None
+_plan_checked = 0.0
+_plan_error = ""
+_plan_lock = threading.Lock()
+
+_memo_store: OrderedDict = OrderedDict()
+_memo_lock = threading.Lock()
+_memo_counts = {"hits": 0, "misses": 0}
+
+
+def _memo(key: tuple, compute):
+    with _memo_lock:
+        hit = _memo_store.get(key)
+        if hit is not None:
+            _memo_store.move_to_end(key)
+            _memo_counts["hits"] += 1
+            return hit
+        _memo_counts["misses"] += 1
+
+    value = compute()
+
+    with _memo_lock:
+        _memo_store[key] = value
+        while len(_memo_store) > RULES_MEMO_SIZE:
+            _memo_store.popitem(last=False)
+    return value
+
+
+def get_rule_plan() -> RulePlan:
+    """
+    Current plan; re-reads RULES_PATH when its mtime/size changed (checked every
+    RULES_CHECK_SECONDS). A broken file keeps the previous plan and sets rules_status()["error"].
+    A reload only drops memoized filter/score results; fetch + enrichment caches are untouched.
+    """
+    global _plan, _plan_sig, _plan_checked, _plan_error
+
+    if _plan is not None and (time.monotonic() - _plan_checked) < RULES_CHECK_SECONDS:
+        return _plan
+
+    with _plan_lock:
+        _plan_checked = time.monotonic()
+        try:
+            st = os.stat(RULES_PATH)
+            sig = (st.st_mtime_ns, st.st_size)
+        except OSError as e:
+            if _plan is None:
+                raise
+            _plan_error = f"{type(e).__name__}: {e}"
+            return _plan
+
+        if sig != _plan_sig:
+            _plan_sig = sig
+            try:
+                plan = load_rule_plan(RULES_PATH)
+            except Exception as e:
+                if _plan is None:
+                    raise
+                _plan_error = f"{type(e).__name__}: {e}"
+            else:
+                _plan = plan
+                _plan_error = ""
+                with _memo_lock:
+                    _memo_store.clear()
+
+    return _plan
+
+
+def rules_status() -> dict:
+    plan = get_rule_plan()
+    with _memo_lock:
+        memo = dict(_memo_counts, size=len(_memo_store))
+    return {"version": plan.version, "digest": plan.digest, "path": RULES_PATH, "error": _plan_error, "memo": memo}
+
+
+def rule_stats() -> list[dict]:
+    """Per-rule counters for the current plan (evaluations = memo misses). Reset on reload."""
+    plan = get_rule_plan()
+    rows = []
+    with plan._stats_lock:
+        for name, st in plan.stats.items():
+            evals = st["evals"]
+            rows.append({
+                "rule": name,
+                "evals": evals,
+                "fired": st["fired"],
+                "fire_rate": round(st["fired"] / evals, 3) if evals else 0.0,
+                "hits": st["hits"],
+                "avg_us": round(st["ns"] / evals / 1000.0, 1) if evals else 0.0,
+                "total_ms": round(st["ns"] / 1e6, 1),
+            })
+    return rows
+
+
+# =========================
+# FETCHERS
+# =========================
+def fetch_google_news(keywords: list[str]) -> list[dict]:
+    base = " OR ".join(keywords) if keywords else "SPY"
+
+    # Force recency on Google News query
+    when = (
+        "when:1d" if MAX_ARTICLE_AGE_HOURS <= 24
+        else "when:2d" if MAX_ARTICLE_AGE_HOURS <= 48
+        else "when:7d"
+    )
+
+    negative = " ".join([f"-{w}" for w in NEGATIVE_KEYWORDS])
+
+    query = f"({base}) {when} {negative}"
+    url = GOOGLE_NEWS_RSS.format(q=quote(query))
+
+    feed = http_get(url, headers=HEADERS, timeout=12)
+    feed.raise_for_status()
+
+    import feedparser
+    parsed = feedparser.parse(feed.content)
+
+    items = []
+    for e in parsed.entries[:50]:
+        title = getattr(e, "title", "") or ""
+        link = getattr(e, "link", "") or ""
+        published = getattr(e, "published", "") or ""
+        summary = getattr(e, "summary", "") or ""
+
+        ts = safe_parse_time(published)
+        items.append({
+            "source": "OZYTARGET.COM",
+            "title": title.strip(),
+            "link": link.strip(),
+            "time": published.strip(),
+            "summary": summary.strip(),
+            "_ts": ts,
+        })
+    return items
+
+
+def fetch_bing_news(keywords: list[str]) -> list[dict]:
+    if not BING_API_KEY:
+        return []
+
+    base = " OR ".join(keywords) if keywords else "SPY"
+
+    # Bing soporta operadores booleanos; esto ayuda a filtrar desde origen
+    # (No es perfecto, pero reduce bastante el ruido)
+    negatives = " OR ".join(NEGATIVE_KEYWORDS)
+    query = f"({base}) NOT ({negatives})"
+
+    freshness = "Day" if MAX_ARTICLE_AGE_HOURS <= 24 else "Week"
+
+    params = {
+        "q": query,
+        "mkt": "en-US",
+        "count": 25,
+        "sortBy": "Date",
+        "freshness": freshness,
+        "safeSearch": "Off",
+        "textFormat": "Raw",
+    }
+    headers = {"Ocp-Apim-Subscription-Key": BING_API_KEY, **HEADERS}
+    r = http_get(BING_NEWS_ENDPOINT, params=params, headers=headers, timeout=12)
+    r.raise_for_status()
+    data = r.json()
+
+    items = []
+    for v in data.get("value", [])[:25]:
+        title = (v.get("name") or "").strip()
+        link = (v.get("url") or "").strip()
+        published = (v.get("datePublished") or "").strip()
+        ts = safe_parse_time(published)
+
+        items.append({
+            "source": "OZYTARGET.COM",
+            "title": title,
+            "link": link,
+            "time": published,
+            "summary": "",
+            "_ts": ts,
+        })
+    return items
+
+
+# =========================
+# PIPELINE
+# =========================
+def fetch_items(keywords: list[str]) -> list[dict]:
+    """Upstream stage (what app.py caches): fetch -> dedupe -> normalize."""
+    items: list[dict] = []
+
+    try:
+        items.extend(fetch_google_news(keywords))
+    except Exception:
+        pass
+
+    try:
+        items.extend(fetch_bing_news(keywords))
+    except Exception:
+        pass
+
+    items = dedupe(items)
+
+    # One normalized text per article, shared by every filter + scorer below
+    return [normalize_item(x) for x in items]
+
+
+def process_items(items: list[dict], min_kw: int, max_noise: int) -> list[dict]:
+    """Rules stage: enrich -> trends -> filter -> score -> archive -> sort, against the current (hot-reloaded) rule plan."""
+    plan = get_rule_plan()
+
+    # Optional lead-paragraph enrichment: cache reads only, never waits on the network
+    import enrich
+    if enrich.ENRICH_ENABLED:
+        items = enrich.enrich_items(items)
+
+    items = [normalize_item(x) for x in items]
+
+    # Keyword velocity: new articles only, hard-blocked ones skipped, before the min_kw / noise thresholds
+    import trends
+    trends.get_trend_engine().observe(items)
+
+    items = filter_institutional(items, min_kw=min_kw, max_noise=max_noise, plan=plan)
+
+    # Score solo para badges (no para ordenar)
+    items = [score_bloomberg(x, plan=plan) for x in items]
+
+    # Historical archive (NEWS_ARCHIVE_DB): scored headlines, written once per article
+    import archive
+    if archive.ARCHIVE_ENABLED:
+        archive.record(items)
+
+    # ORDER = MOST RECENT FIRST
+    items.sort(key=lambda x: x.get("_ts", 0.0), reverse=True)
+
+    return items
+
+
+def run_pipeline(keywords: list[str], min_kw: int, max_noise: int) -> list[dict]:
+    return process_items(fetch_items(keywords), min_kw=min_kw, max_noise=max_noise)
+
+
+def render_card_html(a: dict) -> str:
+    return f"""
+<div class="card">
+  <div class="meta">
+    <span class="source">{a.get('source','')}</span>
+    <span>{time_ago(a.get('_ts', 0.0))} ago</span>
+    <span class="badge">score={a.get('_score', 0)}</span>
+    <span class="badge">kw={a.get('_kw_hits', 0)}</span>
+    <span class="badge">noise={a.get('_noise_hits', 0)}</span>
+    <span class="badge">{a.get('_domain','')}</span>
+    <span style="margin-left:10px;">| {a.get('time','')}</span>
+  </div>
+  <div class="title">
+    <a href="{a.get('link','')}" target="_blank" style="color:#e6edf3; text-decoration:none;">
+      {a.get('title','')}
+    </a>
+    <span class="badge" style="margin-left:8px;">{a.get('_reasons','')}</span>
+  </div>
+</div>
+"""
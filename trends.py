@@ -0,0 +1,173 @@
+# trends.py
+# Sliding-window keyword velocity + z-scores ("how fast is 'repo' accelerating?")
+#
+# - Each new article is counted once, at its published time (_ts), using the same
+#   matchers as count_hits (scanner.matched_terms) on its normalized text
+# - Per term, three time-bucketed ring buffers, O(1) per hit and fixed memory:
+#       5m  window -> 1-minute buckets x 60   (baseline: the previous 5m blocks of the last hour)
+#       1h  window -> 5-minute buckets x 288  (baseline: the previous hours of the last 24h)
+#       24h window -> 1-hour buckets x 168    (baseline: the previous days of the last week)
+# - velocity = mentions per hour in the window; z = (window count - baseline mean) / baseline std
+#
+# Tracked terms default to the institutional list of the current scoring rules;
+# articles its hard_block list drops are not counted.
+
+import math
+import threading
+from collections import OrderedDict
+
+import scanner
+
+
+# =========================
+# CONFIG
+# =========================
+# window -> (bucket seconds, buckets in ring, buckets per window)
+WINDOWS = {
+    "5m": (60, 60, 5),
+    "1h": (300, 288, 12),
+    "24h": (3600, 168, 24),
+}
+
+TRENDS_MAX_SEEN = 50000   # article keys remembered so refreshes are not double counted
+MIN_BASELINE_STD = 1.0    # z-score floor for quiet terms (also >= sqrt(mean), Poisson-like)
+
+
+class _Ring:
+    """Fixed-size ring of time buckets; each slot remembers which bucket index it holds."""
+
+    __slots__ = ("width", "size", "counts", "stamps")
+
+    def __init__(self, width: int, size: int):
+        self.width = width
+        self.size = size
+        self.counts = [0] * size
+        self.stamps = [-1] * size
+
+    def add(self, ts: float, now: float) -> None:
+        idx = int(ts // self.width)
+        now_idx = int(now // self.width)
+        if idx > now_idx or idx <= now_idx - self.size:
+            return  # future-dated, or older than this ring covers
+        slot = idx % self.size
+        if self.stamps[slot] != idx:
+            if self.stamps[slot] > idx:
+                return  # slot already reused by a newer bucket
+            self.stamps[slot] = idx
+            self.counts[slot] = 0
+        self.counts[slot] += 1
+
+    def block_sums(self, now: float, per_block: int) -> list[int]:
+        """Counts of consecutive blocks of per_block buckets, newest first (block 0 = current window)."""
+        now_idx = int(now // self.width)
+        out = []
+        for b in range(self.size // per_block):
+            total = 0
+            for k in range(per_block):
+                idx = now_idx - b * per_block - k
+                slot = idx % self.size
+                if self.stamps[slot] == idx:
+                    total += self.counts[slot]
+            out.append(total)
+        return out
+
+
+class TrendEngine:
+    def __init__(self, terms: list[str] | None = None, max_seen: int = TRENDS_MAX_SEEN):
+        self._fixed_terms = list(terms) if terms else None
+        self.max_seen = max_seen
+        self._seen: OrderedDict[str, None] = OrderedDict()
+        self._rings: dict[str, dict[str, _Ring]] = {}
+        self._lock = threading.Lock()
+        self.articles = 0
+
+    def terms(self) -> list[str]:
+        if self._fixed_terms is not None:
+            return self._fixed_terms
+        return list(scanner.get_rule_plan().institutional_terms)
+
+    def _series(self, term: str) -> dict[str, _Ring]:
+        rings = self._rings.get(term)
+        if rings is None:
+            rings = {w: _Ring(width, size) for w, (width, size, _) in WINDOWS.items()}
+            self._rings[term] = rings
+        return rings
+
+    def observe(self, items: list[dict]) -> int:
+        """
+        Count each not-yet-seen article once. Returns how many were counted.
+        Articles the rule plan hard-blocks (sports / travel / lifestyle) are skipped,
+        like the filter stage drops them, so they cannot move a term's velocity.
+        """
+        terms = self.terms()
+        hard_block_re = scanner.get_rule_plan().hard_block_re
+        now = scanner.clock()
+        new = 0
+        with self._lock:
+            for a in items:
+                key = (a.get("link") or "").strip() or (a.get("title") or "").strip().lower()
+                if not key or key in self._seen:
+                    continue
+                self._seen[key] = None
+                if len(self._seen) > self.max_seen:
+                    self._seen.popitem(last=False)
+
+                ts = float(a.get("_ts") or 0.0)
+                if ts <= 0:
+                    continue
+                text = scanner.normalize_item(a)["_text"]
+                if hard_block_re and hard_block_re.search(text):
+                    continue
+                new += 1
+                for term in scanner.matched_terms(text, terms):
+                    for ring in self._series(term).values():
+                        ring.add(ts, now)
+            self.articles += new
+        return new
+
+    def snapshot(self, window: str = "1h", now: float | None = None) -> list[dict]:
+        """One row per term that has any count in the ring: count, velocity/h, baseline, z."""
+        width, _, per_block = WINDOWS[window]
+        now = scanner.clock() if now is None else now
+        hours = width * per_block / 3600.0
+
+        rows = []
+        with self._lock:
+            for term, rings in self._rings.items():
+                blocks = rings[window].block_sums(now, per_block)
+                current, history = blocks[0], blocks[1:]
+                if not current and not any(history):
+                    continue
+                mean = sum(history) / len(history) if history else 0.0
+                var = sum((x - mean) ** 2 for x in history) / len(history) if history else 0.0
+                std = max(math.sqrt(var), math.sqrt(mean), MIN_BASELINE_STD)
+                rows.append({
+                    "term": term,
+                    "count": current,
+                    "prev": history[0] if history else 0,
+                    "velocity_per_h": round(current / hours, 2),
+                    "baseline": round(mean, 2),
+                    "z": round((current - mean) / std, 2),
+                })
+        rows.sort(key=lambda r: (r["z"], r["count"]), reverse=True)
+        return rows
+
+    def top(self, window: str = "1h", n: int = 8, min_count: int = 1) -> list[dict]:
+        return [r for r in self.snapshot(window) if r["count"] >= min_count][:n]
+
+
+_engine: TrendEngine | None = None
+_engine_lock = threading.Lock()
+
+
+def get_trend_engine() -> TrendEngine:
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = TrendEngine()
+    return _engine
+
+
+def trend_snapshot(window: str = "1h") -> list[dict]:
+    """API: all tracked terms with activity in `window` ("5m" | "1h" | "24h"), fastest-rising first."""
+    return get_trend_engine().snapshot(window)